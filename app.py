@@ -1,45 +1,203 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Blueprint, current_app, jsonify, request, send_from_directory, g, has_request_context, has_app_context
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from flask_cors import CORS
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event as sa_event, inspect as sa_inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.exc import DBAPIError
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from werkzeug.utils import secure_filename
+from werkzeug.local import LocalProxy
 import os
+import re
+import gzip
+import json
+import uuid
+import fcntl
+import time
+import base64
+import hashlib
+import logging
+import threading
+import struct
+import zlib
+import math
+import random
+import inspect
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
+from functools import wraps
+import tempfile
+import mimetypes
+import weakref
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.mysql import match as mysql_match
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 
-# Cargar variables de entorno
-load_dotenv()
-IS_PROD = os.environ.get('RENDER') is not None
+try:
+    from whitenoise import WhiteNoise
+except ImportError:
+    WhiteNoise = None
 
-app = Flask(__name__, static_folder='dist', static_url_path='')
-CORS(app)
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # solo necesario con STORAGE_BACKEND=s3
+    boto3 = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional: sin él no se generan derivados
+    Image = None
+
+logger = logging.getLogger(__name__)
 
-# Configuración de carpetas
-app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi'}
+DEFAULT_EVENT_DATE = '2025-08-10T06:00:00'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# ==================== CONFIGURACIÓN DE BASE DE DATOS (MYSQL) ====================
+def app_state(name):
+    # Estado en memoria de la app activa (app.extensions[name], creado en create_app):
+    # dos apps en el mismo proceso no comparten cachés, cupos ni índices
+    return LocalProxy(lambda: current_app.extensions[name])
+
+# ==================== CONFIGURACIÓN ====================
 
 user = "u659323332_mmq"
 password = quote_plus("Mmq23456*")
 host = "82.197.82.29"
 database = "u659323332_mmq"
 
-# Conexión directa usando mysql-connector
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+mysqlconnector://{user}:{password}@{host}/{database}"
+def default_config():
+    # Se lee del entorno al crear la app (después de load_dotenv), no al importar el módulo
+    return {
+        # Configuración de carpetas
+        'UPLOAD_FOLDER': os.path.join(os.getcwd(), 'uploads'),
+        # Subidas por partes en curso; fuera de UPLOAD_FOLDER para no servirlas por /uploads
+        'CHUNK_UPLOAD_FOLDER': os.path.join(os.getcwd(), 'uploads_partial'),
+        # Con un proxy (nginx/apache) delante, USE_X_SENDFILE=1 delega el envío de /uploads al proxy
+        'USE_X_SENDFILE': os.environ.get('USE_X_SENDFILE') == '1',
+        # 'local' (UPLOAD_FOLDER) o 's3' (cualquier servicio compatible, p. ej. MinIO en local)
+        'STORAGE_BACKEND': os.environ.get('STORAGE_BACKEND', 'local'),
+        'S3_BUCKET': os.environ.get('S3_BUCKET'),
+        'S3_ENDPOINT_URL': os.environ.get('S3_ENDPOINT_URL'),
+        'S3_PUBLIC_URL': os.environ.get('S3_PUBLIC_URL'),
+        # Procesos que generan derivados de imágenes e hilos que guardan los archivos de una subida masiva
+        'VARIANT_WORKERS': int(os.environ.get('VARIANT_WORKERS', 2)),
+        'BULK_SAVE_WORKERS': int(os.environ.get('BULK_SAVE_WORKERS', 4)),
 
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    "pool_pre_ping": True,
-    "pool_recycle": 280,
-}
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        # Conexión directa usando mysql-connector (DATABASE_URL permite apuntar a otra base, p. ej. SQLite)
+        'SQLALCHEMY_DATABASE_URI': os.environ.get(
+            'DATABASE_URL', f"mysql+mysqlconnector://{user}:{password}@{host}/{database}"
+        ),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'DB_POOL_SIZE': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'DB_MAX_OVERFLOW': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'DB_POOL_TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'DB_POOL_RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+        'DB_CONNECT_TIMEOUT': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+        # Carpeta compartida por los workers para sumar sus métricas en /metrics (vacía: solo este proceso)
+        'METRICS_DIR': os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'quibd-metrics')),
+        'METRICS_FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 5)),
+        # Réplicas de lectura para los GET públicos (URLs separadas por comas); sin ellas todo va al primario
+        'DATABASE_REPLICA_URLS': [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()],
+        'REPLICA_RETRY_INTERVAL': float(os.environ.get('REPLICA_RETRY_INTERVAL', 30)),
+        'REPLICA_STICKY_SECONDS': int(os.environ.get('REPLICA_STICKY_SECONDS', 300)),
+
+        'CACHE_TTL': float(os.environ.get('CACHE_TTL', 300)),
+        'CACHE_MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 512)),
+
+        # Con SNAPSHOT_PUBLISH=1 cada cambio regenera dist/snapshots/*.json (servible como estático)
+        'SNAPSHOT_PUBLISH': os.environ.get('SNAPSHOT_PUBLISH') == '1',
+
+        # Stream SSE de versiones: cada conexión ocupa un hilo del worker mientras dura
+        'SYNC_MAX_STREAMS': int(os.environ.get('SYNC_MAX_STREAMS', 2)),
+        # Hilos del presupuesto de peticiones largas que los streams nunca ocupan (para subidas)
+        'SYNC_STREAM_RESERVE': int(os.environ.get('SYNC_STREAM_RESERVE', 1)),
+        'SYNC_POLL_INTERVAL': float(os.environ.get('SYNC_POLL_INTERVAL', 2)),
+        # Archivo con la última versión confirmada, compartido por los workers de la máquina: la
+        # caché de respuestas la lee de ahí sin consultar sync_state. Por defecto uno por base de
+        # datos en el directorio temporal; vacío lo desactiva (varias máquinas contra la misma base).
+        'SYNC_VERSION_FILE': os.environ.get('SYNC_VERSION_FILE'),
+        'SYNC_STREAM_TIMEOUT': float(os.environ.get('SYNC_STREAM_TIMEOUT', 60)),
 
-# Inicialización de SQLAlchemy
-db = SQLAlchemy(app)
+        # Recolector de archivos huérfanos (GC_INTERVAL=0 lo desactiva; `flask gc-uploads` lo lanza a mano)
+        'GC_INTERVAL': float(os.environ.get('GC_INTERVAL', 3600)),
+        'GC_GRACE_PERIOD': float(os.environ.get('GC_GRACE_PERIOD', 3600)),
+        'GC_BATCH_SIZE': int(os.environ.get('GC_BATCH_SIZE', 200)),
+        'GC_BATCH_PAUSE': float(os.environ.get('GC_BATCH_PAUSE', 0.1)),
+        # Subidas por partes sin actividad durante este tiempo (segundos) se descartan
+        'CHUNK_UPLOAD_TTL': float(os.environ.get('CHUNK_UPLOAD_TTL', 24 * 3600)),
+        # Lápidas de sincronización más antiguas que esto (segundos) se purgan; los clientes
+        # con un `since` anterior reciben `reset` y recargan todo
+        'SYNC_TOMBSTONE_RETENTION': float(os.environ.get('SYNC_TOMBSTONE_RETENTION', 30 * 24 * 3600)),
+
+        # Tamaño máximo del cuerpo (bytes): general, subida de un archivo, subida masiva,
+        # cada parte de la subida reanudable y tamaño total declarado al iniciarla
+        'MAX_CONTENT_LENGTH': int(os.environ.get('MAX_CONTENT_LENGTH', 1024 * 1024)),
+        'UPLOAD_MAX_SIZE': int(os.environ.get('UPLOAD_MAX_SIZE', 512 * 1024 * 1024)),
+        'BULK_UPLOAD_MAX_SIZE': int(os.environ.get('BULK_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)),
+        'CHUNK_MAX_SIZE': int(os.environ.get('CHUNK_MAX_SIZE', 16 * 1024 * 1024)),
+        'CHUNKED_UPLOAD_MAX_SIZE': int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024)),
+
+        # Hilos por worker (los mismos que gunicorn.conf.py) y cuántos quedan siempre libres para
+        # lecturas: subidas, esperas en cola, exportaciones y streams SSE comparten el resto
+        'WORKER_THREADS': int(os.environ.get('GUNICORN_THREADS', 4)),
+        'RESERVED_READ_THREADS': int(os.environ.get('RESERVED_READ_THREADS', 2)),
+        # Cupos por proceso dentro de ese presupuesto
+        'UPLOAD_CONCURRENCY': int(os.environ.get('UPLOAD_CONCURRENCY', 1)),
+        'UPLOAD_QUEUE_SIZE': int(os.environ.get('UPLOAD_QUEUE_SIZE', 2)),
+        'UPLOAD_QUEUE_TIMEOUT': float(os.environ.get('UPLOAD_QUEUE_TIMEOUT', 5)),
+        'EXPORT_CONCURRENCY': int(os.environ.get('EXPORT_CONCURRENCY', 1)),
+        'ADMISSION_RETRY_AFTER': int(os.environ.get('ADMISSION_RETRY_AFTER', 10)),
+    }
+
+def engine_options(config, uri=None):
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": config['DB_POOL_RECYCLE'],
+    }
+    uri = uri or config['SQLALCHEMY_DATABASE_URI']
+    # SQLite usa pools sin tamaño/overflow configurables
+    if not uri.startswith('sqlite'):
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+        )
+    if uri.startswith('mysql+mysqlconnector'):
+        options['connect_args'] = {'connection_timeout': config['DB_CONNECT_TIMEOUT']}
+    elif uri.startswith('mysql+pymysql'):
+        options['connect_args'] = {'connect_timeout': config['DB_CONNECT_TIMEOUT']}
+    return options
+
+class RoutingSession(FlaskSQLAlchemySession):
+    # Las lecturas de los GET públicos van a la réplica elegida para la petición (g.read_bind);
+    # los flush y los INSERT/UPDATE/DELETE explícitos siempre van al primario
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_app_context() and g.get('read_bind') is not None):
+            return g.read_bind
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+# Se enlaza a la app en create_app()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+bp = Blueprint('main', __name__, cli_group=None)
 
 # ==================== MODELOS ====================
 
@@ -60,6 +218,13 @@ class Event(db.Model):
     category = db.Column(db.String(50), default='evento')
     featured = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Versión global de la última escritura (ver SINCRONIZACIÓN)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
+
+    # Índice de búsqueda de texto completo (solo MySQL; en otros motores se usa SearchIndex)
+    __table_args__ = (
+        db.Index('ft_events_text', 'title', 'description', 'category', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
 
     def to_dict(self):
         return {
@@ -70,6 +235,8 @@ class Event(db.Model):
             'image': self.image,
             'category': self.category,
             'featured': self.featured,
+            'variants': image_variants(self.image),
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -82,20 +249,22 @@ class GalleryItem(db.Model):
     year = db.Column(db.Integer, nullable=False)
     type = db.Column(db.String(50), default='image')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Versión global de la última escritura (ver SINCRONIZACIÓN)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
 
     event = db.relationship('Event', backref='gallery_items')
 
+    # Índices compuestos para la paginación por cursor (created_at, id) y sus filtros
+    __table_args__ = (
+        db.Index('ix_gallery_created_id', 'created_at', 'id'),
+        db.Index('ix_gallery_event_created_id', 'event_id', 'created_at', 'id'),
+        db.Index('ix_gallery_year_created_id', 'year', 'created_at', 'id'),
+        db.Index('ix_gallery_type_created_id', 'type', 'created_at', 'id'),
+        db.Index('ft_gallery_alt', 'alt', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
     def to_dict(self):
-        return {
-            'id': str(self.id),
-            'src': self.src,
-            'alt': self.alt,
-            'event': self.event.title if self.event else '',
-            'event_id': self.event_id,
-            'year': self.year,
-            'type': self.type,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return serialize_gallery_item(self, self.event.title if self.event else '')
 
 class HeroSettings(db.Model):
     __tablename__ = 'hero_settings'
@@ -103,12 +272,15 @@ class HeroSettings(db.Model):
     hero_video = db.Column(db.String(500))
     event_date = db.Column(db.String(100))
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Versión global de la última escritura (ver SINCRONIZACIÓN)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
 
     def to_dict(self):
         return {
             'id': self.id,
             'heroVideo': self.hero_video,
             'eventDate': self.event_date,
+            'version': self.version,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
@@ -119,6 +291,8 @@ class Sponsor(db.Model):
     logo = db.Column(db.String(500), nullable=False)
     tier = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Versión global de la última escritura (ver SINCRONIZACIÓN)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
 
     def to_dict(self):
         return {
@@ -126,81 +300,2160 @@ class Sponsor(db.Model):
             'name': self.name,
             'logo': self.logo,
             'tier': self.tier,
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class StoredFile(db.Model):
+    __tablename__ = 'stored_files'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    url = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    # CRC-32 del contenido (lo necesita la exportación ZIP); NULL en filas anteriores a la columna
+    crc32 = db.Column(db.BigInteger)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SyncState(db.Model):
+    __tablename__ = 'sync_state'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    # Última versión cuyas lápidas ya se purgaron: un `since` anterior no puede recibir un delta
+    pruned_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_tombstones_entity_version', 'entity', 'version'),
+    )
+
+# ==================== SERIALIZACIÓN ====================
+
+# Columnas planas de la galería + título del evento en un solo JOIN (evita el N+1 de GalleryItem.event)
+GALLERY_COLUMNS = (
+    GalleryItem.id,
+    GalleryItem.src,
+    GalleryItem.alt,
+    GalleryItem.event_id,
+    GalleryItem.year,
+    GalleryItem.type,
+    GalleryItem.created_at,
+    GalleryItem.version,
+    Event.title.label('event_title'),
+)
+
+def gallery_rows():
+    return db.session.query(*GALLERY_COLUMNS).outerjoin(Event, Event.id == GalleryItem.event_id)
+
+def serialize_gallery_item(row, event_title):
+    return {
+        'id': str(row.id),
+        'src': row.src,
+        'alt': row.alt,
+        'event': event_title,
+        'event_id': row.event_id,
+        'year': row.year,
+        'type': row.type,
+        'variants': image_variants(row.src),
+        'version': row.version,
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+
+def gallery_row_to_dict(row):
+    return serialize_gallery_item(row, row.event_title or '')
+
+# ==================== DERIVADOS DE IMÁGENES ====================
+
+# Anchos responsive generados para cada imagen subida (más una versión WebP de cada uno)
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+VARIANT_FOLDER = 'variants'
+
+_variant_executor = None
+_variant_executor_pid = None
+
+def variant_names(filename):
+    stem, ext = filename.rsplit('.', 1)
+    ext = ext.lower()
+    return [(width, f"{stem}_{width}.{ext}", f"{stem}_{width}.webp") for width in VARIANT_WIDTHS]
+
+def generate_variants(path):
+    # Se ejecuta en el pool de procesos: no debe tocar la app ni la base de datos
+    folder, filename = os.path.split(path)
+    out_folder = os.path.join(folder, VARIANT_FOLDER)
+    os.makedirs(out_folder, exist_ok=True)
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        fmt = 'PNG' if filename.lower().endswith('.png') else 'JPEG'
+        for width, name, webp_name in variant_names(filename):
+            image = original.copy()
+            # thumbnail nunca amplía: las imágenes pequeñas conservan su tamaño original
+            image.thumbnail((width, width * 10), Image.LANCZOS)
+            if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            for out_name, out_format, options in (
+                (name, fmt, {'quality': 82, 'optimize': True} if fmt == 'JPEG' else {'optimize': True}),
+                (webp_name, 'WEBP', {'quality': 80, 'method': 4}),
+            ):
+                # Escritura atómica: image_variants() solo ve archivos completos. Temporal único:
+                # con deduplicación dos trabajos pueden generar el mismo objeto a la vez
+                fd, tmp_path = tempfile.mkstemp(prefix=f".{out_name}.", suffix='.tmp', dir=out_folder)
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        image.save(f, out_format, **options)
+                    os.replace(tmp_path, os.path.join(out_folder, out_name))
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+    return path
+
+def variant_executor():
+    global _variant_executor, _variant_executor_pid
+    # Se crea perezosamente en cada worker: un pool heredado por fork no es utilizable
+    if _variant_executor is None or _variant_executor_pid != os.getpid():
+        _variant_executor = ProcessPoolExecutor(max_workers=current_app.config['VARIANT_WORKERS'])
+        _variant_executor_pid = os.getpid()
+    return _variant_executor
+
+def on_variants_done(future):
+    if future.exception() is not None:
+        logger.warning("No se pudieron generar derivados: %s", future.exception())
+        return
+    response_cache.invalidate('gallery', 'events')
+
+def variant_paths(path):
+    folder, filename = os.path.split(path)
+    return [
+        os.path.join(folder, VARIANT_FOLDER, name)
+        for _, raster, webp in variant_names(filename) for name in (raster, webp)
+    ]
+
+def schedule_variants(path):
+    # path es None cuando el archivo no está en disco local (almacenamiento S3)
+    if Image is None or not path or path.rsplit('.', 1)[-1].lower() not in VARIANT_EXTENSIONS:
+        return None
+    # Un archivo deduplicado ya tiene sus derivados
+    if os.path.exists(variant_paths(path)[-1]):
+        return None
+    future = variant_executor().submit(generate_variants, path)
+    future.add_done_callback(on_variants_done)
+    return future
+
+def image_variants(url):
+    if not url or not url.startswith('/uploads/') or url.rsplit('.', 1)[-1].lower() not in VARIANT_EXTENSIONS:
+        return None
+    folder_url, filename = url.rsplit('/', 1)
+    names = variant_names(filename)
+    disk_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], folder_url[len('/uploads/'):], VARIANT_FOLDER)
+    # El WebP más grande es el último archivo que escribe generate_variants
+    if not os.path.exists(os.path.join(disk_folder, names[-1][2])):
+        return None
+    base = f"{folder_url}/{VARIANT_FOLDER}"
+    return {
+        'thumbnail': f"{base}/{names[0][2]}",
+        'srcset': ', '.join(f"{base}/{name} {width}w" for width, name, _ in names),
+        'webp_srcset': ', '.join(f"{base}/{webp} {width}w" for width, _, webp in names),
+    }
+
+@bp.cli.command('backfill-variants')
+def backfill_variants():
+    # Genera los derivados que falten para todas las imágenes ya subidas
+    pending = []
+    for root, dirs, files in os.walk(current_app.config['UPLOAD_FOLDER']):
+        dirs[:] = [d for d in dirs if d != VARIANT_FOLDER]
+        for filename in files:
+            if filename.rsplit('.', 1)[-1].lower() not in VARIANT_EXTENSIONS:
+                continue
+            last_webp = variant_names(filename)[-1][2]
+            if not os.path.exists(os.path.join(root, VARIANT_FOLDER, last_webp)):
+                pending.append(schedule_variants(os.path.join(root, filename)))
+    failed = 0
+    for future in pending:
+        if future is not None and future.exception() is not None:
+            failed += 1
+    print(f"✅ Derivados generados: {len(pending) - failed} (errores: {failed})")
+
+# ==================== MÉTRICAS ====================
+
+# Por petición: nº de consultas, tiempo en BD, tiempo de serialización JSON y tamaño de la respuesta
+# (cabecera Server-Timing). En /metrics: histogramas por ruta y contadores sumados entre todos los
+# workers, más los gauges (pool, cupos de admisión) de cada worker vivo con la etiqueta pid.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestMetrics:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._routes = {}
+        self._counters = {'pre_ping_failures': 0, 'pool_invalidations': 0, 'gc_files_removed': 0, 'body_too_large': 0, 'replica_failures': 0}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, duration, queries, db_time, payload):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                    'queries': 0, 'db_seconds': 0.0, 'bytes': 0, 'status': {}
+                }
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['sum'] += duration
+            stats['queries'] += queries
+            stats['db_seconds'] += db_time
+            stats['bytes'] += payload
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'routes': [
+                    {**stats, 'route': route, 'method': method, 'buckets': list(stats['buckets']),
+                     'status': {str(status): total for status, total in stats['status'].items()}}
+                    for (route, method), stats in self._routes.items()
+                ],
+                'counters': dict(self._counters),
+            }
+
+request_metrics = RequestMetrics(LATENCY_BUCKETS)
+
+@sa_event.listens_for(Engine, 'before_cursor_execute')
+def _metrics_before_cursor(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@sa_event.listens_for(Engine, 'after_cursor_execute')
+def _metrics_after_cursor(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+@sa_event.listens_for(Engine, 'handle_error')
+def _metrics_handle_error(context):
+    if context.is_pre_ping:
+        request_metrics.increment('pre_ping_failures')
+
+@sa_event.listens_for(Pool, 'invalidate')
+def _metrics_pool_invalidate(dbapi_connection, connection_record, exception):
+    request_metrics.increment('pool_invalidations')
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_request_context() and 'metrics_start' in g:
+                g.serialize_time += time.perf_counter() - start
+
+@bp.before_app_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+    g.serialize_time = 0.0
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if 'metrics_start' not in g:
+        return response
+    duration = time.perf_counter() - g.metrics_start
+    payload = response.content_length or 0
+    response.headers['Server-Timing'] = ', '.join((
+        f'db;dur={g.db_time * 1000:.2f};desc="{g.db_queries} queries"',
+        f'ser;dur={g.serialize_time * 1000:.2f};desc="{payload} bytes"',
+        f'app;dur={duration * 1000:.2f}',
+    ))
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_metrics.observe(route, request.method, response.status_code, duration, g.db_queries, g.db_time, payload)
+    return response
+
+# Cada worker vuelca su instantánea en METRICS_DIR cada METRICS_FLUSH_INTERVAL segundos (y al
+# responder /metrics); quien responde suma las de todos los workers del mismo master. Los archivos
+# de workers muertos se conservan para que los contadores nunca retrocedan; sus gauges no se muestran.
+COUNTER_METRICS = (
+    ('db_pool_pre_ping_failures_total', 'pre_ping_failures'),
+    ('db_pool_invalidations_total', 'pool_invalidations'),
+    ('uploads_gc_files_removed_total', 'gc_files_removed'),
+    ('http_body_too_large_total', 'body_too_large'),
+    ('db_replica_failures_total', 'replica_failures'),
+)
+
+_metrics_file = None
+_metrics_file_pid = None
+_metrics_thread_pid = None
+_metrics_thread_lock = threading.Lock()
+
+def worker_snapshot(pool):
+    gauges = []
+    # QueuePool expone size/checkedout/overflow; otros pools (p. ej. SQLite) no siempre
+    for name, attr in (('db_pool_size', 'size'), ('db_pool_checked_out', 'checkedout'), ('db_pool_overflow', 'overflow')):
+        if hasattr(pool, attr):
+            gauges.append([name, '', getattr(pool, attr)()])
+    for gate in admission_gates.values():
+        gauges.append(['admission_in_flight', f'gate="{gate.name}"', gate.in_flight])
+        gauges.append(['admission_queue_depth', f'gate="{gate.name}"', gate.waiting])
+    gauges.append(['admission_long_threads_in_use', '', long_request_threads.in_use])
+    gauges.append(['admission_long_threads_capacity', '', long_request_threads.capacity])
+    return {
+        'pid': os.getpid(),
+        **request_metrics.snapshot(),
+        'admission': {gate.name: [gate.admitted, gate.rejected] for gate in admission_gates.values()},
+        'gauges': gauges,
+    }
+
+def render_metrics(snapshots, live_pids):
+    routes = {}
+    counters = {}
+    admission = {}
+    for snapshot in snapshots:
+        for stats in snapshot['routes']:
+            merged = routes.setdefault((stats['route'], stats['method']), {
+                'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0,
+                'queries': 0, 'db_seconds': 0.0, 'bytes': 0, 'status': {}
+            })
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], stats['buckets'])]
+            for key in ('count', 'sum', 'queries', 'db_seconds', 'bytes'):
+                merged[key] += stats[key]
+            for status, total in stats['status'].items():
+                merged['status'][status] = merged['status'].get(status, 0) + total
+        for name, value in snapshot['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+        for gate, values in snapshot['admission'].items():
+            admission[gate] = [a + b for a, b in zip(admission.get(gate, [0, 0]), values)]
+
+    lines = ['# TYPE http_request_duration_seconds histogram']
+    for (route, method), stats in sorted(routes.items()):
+        labels = f'route="{route}",method="{method}"'
+        for bound, total in zip(LATENCY_BUCKETS, stats['buckets']):
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats["sum"]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats["count"]}')
+    for name, key in (
+        ('http_requests_db_queries_total', 'queries'),
+        ('http_requests_db_seconds_total', 'db_seconds'),
+        ('http_response_bytes_total', 'bytes'),
+    ):
+        lines.append(f'# TYPE {name} counter')
+        for (route, method), stats in sorted(routes.items()):
+            lines.append(f'{name}{{route="{route}",method="{method}"}} {stats[key]}')
+    lines.append('# TYPE http_responses_total counter')
+    for (route, method), stats in sorted(routes.items()):
+        for status, total in sorted(stats['status'].items()):
+            lines.append(f'http_responses_total{{route="{route}",method="{method}",status="{status}"}} {total}')
+    for name, key in COUNTER_METRICS:
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {counters.get(key, 0)}')
+    for name, position in (('admission_admitted_total', 0), ('admission_rejected_total', 1)):
+        lines.append(f'# TYPE {name} counter')
+        for gate, values in sorted(admission.items()):
+            lines.append(f'{name}{{gate="{gate}"}} {values[position]}')
+
+    gauges = {}
+    for snapshot in snapshots:
+        if snapshot['pid'] in live_pids:
+            for name, labels, value in snapshot['gauges']:
+                pid_label = f'pid="{snapshot["pid"]}"'
+                gauges.setdefault(name, []).append(f'{name}{{{pid_label},{labels}}} {value}' if labels else f'{name}{{{pid_label}}} {value}')
+    for name, samples in gauges.items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def flush_metrics(folder, pool):
+    global _metrics_file, _metrics_file_pid
+    # <pid del master>-<pid>-<arranque>.json: un pid reutilizado no pisa los contadores de otro worker
+    if _metrics_file_pid != os.getpid():
+        _metrics_file = f"{os.getppid()}-{os.getpid()}-{time.time_ns()}.json"
+        _metrics_file_pid = os.getpid()
+    os.makedirs(folder, exist_ok=True)
+    # Temporal propio por escritura: el hilo de volcado y un /metrics pueden coincidir
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(worker_snapshot(pool), f)
+        os.replace(tmp_path, os.path.join(folder, _metrics_file))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def collect_snapshots(folder):
+    master = os.getppid()
+    snapshots = []
+    for filename in os.listdir(folder):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(folder, filename)
+        try:
+            owner = int(filename.split('-', 1)[0])
+            if owner != master:
+                # De una ejecución anterior: se borra cuando su master ya no existe
+                if not process_alive(owner):
+                    os.remove(path)
+                continue
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+def metrics_flush_loop(app):
+    while True:
+        time.sleep(app.config['METRICS_FLUSH_INTERVAL'])
+        try:
+            with app.app_context():
+                flush_metrics(app.config['METRICS_DIR'], db.engine.pool)
+        except Exception as e:
+            logger.warning("No se pudieron volcar las métricas: %s", e)
+
+@bp.before_app_request
+def start_metrics_flusher():
+    # Como el recolector: un hilo por worker, arrancado en su primera petición
+    global _metrics_thread_pid
+    if _metrics_thread_pid == os.getpid() or not current_app.config['METRICS_DIR']:
+        return
+    with _metrics_thread_lock:
+        if _metrics_thread_pid != os.getpid():
+            _metrics_thread_pid = os.getpid()
+            threading.Thread(target=metrics_flush_loop, args=(current_app._get_current_object(),), daemon=True).start()
+
+@bp.route('/metrics')
+def metrics():
+    folder = current_app.config['METRICS_DIR']
+    if folder:
+        flush_metrics(folder, db.engine.pool)
+        snapshots = collect_snapshots(folder)
+    else:
+        snapshots = [worker_snapshot(db.engine.pool)]
+    body = render_metrics(snapshots, {s['pid'] for s in snapshots if process_alive(s['pid'])})
+    return current_app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+# ==================== CONTROL DE ADMISIÓN ====================
+
+# Límite de cuerpo por ruta (clave de configuración); el resto usa MAX_CONTENT_LENGTH.
+# Con Content-Length por encima del límite se responde 413 sin leer el cuerpo.
+BODY_LIMITS = {
+    'main.upload_file': 'UPLOAD_MAX_SIZE',
+    'main.create_event': 'UPLOAD_MAX_SIZE',
+    'main.update_event': 'UPLOAD_MAX_SIZE',
+    'main.create_gallery_item': 'UPLOAD_MAX_SIZE',
+    'main.create_sponsor': 'UPLOAD_MAX_SIZE',
+    'main.update_hero_video': 'UPLOAD_MAX_SIZE',
+    'main.create_gallery_bulk': 'BULK_UPLOAD_MAX_SIZE',
+    'main.append_chunk_upload': 'CHUNK_MAX_SIZE',
+}
+
+# Rutas que pueden ocupar un hilo mucho tiempo: cada grupo tiene su propio cupo por proceso.
+# Las que llegan con un cuerpo pequeño (dentro de MAX_CONTENT_LENGTH, p. ej. editar solo los
+# datos de un evento) no pasan por el cupo: son tan cortas como cualquier otra petición.
+ADMISSION_GATES = {
+    **{endpoint: 'uploads' for endpoint in BODY_LIMITS},
+    'main.complete_chunk_upload': 'uploads',
+    'main.export_gallery': 'exports',
+}
+GATED_WITH_ANY_BODY = {'main.complete_chunk_upload', 'main.export_gallery'}
+
+class ThreadBudget:
+    """Hilos del worker que pueden estar ocupados a la vez por peticiones largas.
+
+    Cada subida en curso, cada petición esperando en una cola, cada exportación y cada
+    stream SSE toma un hilo del presupuesto; sin hilos libres se rechaza al momento.
+    Los streams no pueden tomar los últimos `stream_reserve` hilos: quedan para subidas
+    y exportaciones aunque haya clientes escuchando cambios.
+    """
+
+    def __init__(self, capacity, stream_reserve=0):
+        self.capacity = capacity
+        self.stream_reserve = stream_reserve
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def take(self, stream=False):
+        with self._lock:
+            limit = self.capacity - self.stream_reserve if stream else self.capacity
+            if self.in_use >= limit:
+                return False
+            self.in_use += 1
+            return True
+
+    def give_back(self):
+        with self._lock:
+            self.in_use -= 1
+
+long_request_threads = app_state('long_request_threads')
+
+class AdmissionGate:
+    """Semáforo acotado con una cola de espera limitada.
+
+    Con todos los huecos ocupados, hasta `queue_size` peticiones esperan como mucho
+    `timeout` segundos; el resto se rechaza al momento (429).
+    """
+
+    def __init__(self, name, budget, limit, queue_size, timeout):
+        self.name = name
+        self.budget = budget
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        # El hilo queda ocupado tanto esperando en la cola como dentro: ambos cuentan en el presupuesto
+        if not self.budget.take():
+            with self._condition:
+                self.rejected += 1
+            return False
+        with self._condition:
+            if self.in_flight >= self.limit:
+                if self.waiting >= self.queue_size:
+                    self.rejected += 1
+                    self.budget.give_back()
+                    return False
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.in_flight < self.limit, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    self.budget.give_back()
+                    return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+        self.budget.give_back()
+
+def create_admission_gates(config, budget):
+    return {
+        'uploads': AdmissionGate('uploads', budget, config['UPLOAD_CONCURRENCY'],
+                                 config['UPLOAD_QUEUE_SIZE'], config['UPLOAD_QUEUE_TIMEOUT']),
+        'exports': AdmissionGate('exports', budget, config['EXPORT_CONCURRENCY'], 0, 0),
+    }
+
+admission_gates = app_state('admission_gates')
+
+def rejection(message, status, retry_after=None):
+    response = jsonify({'status': 'error', 'message': message})
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    # El cuerpo no se ha leído: se pide al cliente que no reutilice la conexión
+    if request.content_length:
+        response.headers['Connection'] = 'close'
+    return response
+
+@bp.before_app_request
+def admit_request():
+    limit_key = BODY_LIMITS.get(request.endpoint)
+    if limit_key:
+        request.max_content_length = current_app.config[limit_key]
+    limit = request.max_content_length
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        request_metrics.increment('body_too_large')
+        return rejection('Request body too large', 413)
+
+    gate_name = ADMISSION_GATES.get(request.endpoint)
+    small_body = request.content_length is not None and request.content_length <= current_app.config['MAX_CONTENT_LENGTH']
+    if gate_name and (request.endpoint in GATED_WITH_ANY_BODY or not small_body):
+        gate = admission_gates[gate_name]
+        if not gate.acquire():
+            return rejection('Server busy, retry later', 429, current_app.config['ADMISSION_RETRY_AFTER'])
+        g.admission_gate = gate
+
+@bp.after_app_request
+def release_admission_on_close(response):
+    # En respuestas en streaming (exportación ZIP) el hueco se libera al terminar el envío;
+    # las demás lo liberan en teardown
+    if response.is_streamed and 'admission_gate' in g:
+        response.call_on_close(g.pop('admission_gate').release)
+    return response
+
+@bp.teardown_app_request
+def release_admission(exc):
+    gate = g.pop('admission_gate', None)
+    if gate is not None:
+        gate.release()
+
+# ==================== CACHÉ DE RESPUESTAS ====================
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'gzip', 'etag', 'expires', 'version'])
+
+# Por debajo de este tamaño gzip no compensa
+CACHE_GZIP_MIN_SIZE = 1024
+
+# Caché LRU en memoria con TTL para las respuestas JSON públicas, agrupada por namespace.
+# `dependents` propaga la invalidación a namespaces que agregan a otros (p. ej. bootstrap).
+class ResponseCache:
+    def __init__(self, max_entries, ttl, dependents=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.dependents = dependents or {}
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, key, version):
+        # `version`: versión de sincronización vigente. Una entrada calculada antes de una
+        # escritura de otro worker (que este proceso no invalidó) queda descartada.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic() or entry.version < version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, body, generation, version):
+        compressed = gzip.compress(body, 6) if len(body) >= CACHE_GZIP_MIN_SIZE else None
+        entry = CacheEntry(body, compressed, hashlib.sha256(body).hexdigest(), time.monotonic() + self.ttl, version)
+        with self._lock:
+            # Si hubo una invalidación mientras se calculaba la respuesta, no se guarda
+            if self._generations.get(key[0], 0) != generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *namespaces):
+        namespaces = set(namespaces)
+        for namespace in list(namespaces):
+            namespaces.update(self.dependents.get(namespace, ()))
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for key in [k for k in self._entries if k[0] in namespaces]:
+                del self._entries[key]
+
+CACHE_DEPENDENTS = {namespace: ('bootstrap',) for namespace in ('events', 'gallery', 'sponsors', 'hero')}
+
+response_cache = app_state('response_cache')
+
+def cached_response(namespace):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Las invalidaciones solo llegan a este proceso; la versión de sync_state es común a
+            # todos los workers. Se lee antes que los datos y de la misma base (la réplica elegida
+            # por @read_replica, que va por fuera, o el primario), así que nunca es más nueva que ellos.
+            version = request_sync_version()
+            key = (namespace, request.full_path)
+            entry = response_cache.get(key, version)
+            if entry is None:
+                generation = response_cache.generation(namespace)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = response_cache.set(key, response.get_data(), generation, version)
+            # ETag fuerte: un navegador con la versión vigente recibe 304 sin consulta ni JSON
+            use_gzip = entry.gzip is not None and 'gzip' in request.accept_encodings
+            response = current_app.response_class(entry.gzip if use_gzip else entry.body, mimetype='application/json')
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+            response.set_etag(f"{entry.etag}-gz" if use_gzip else entry.etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+# ==================== SINCRONIZACIÓN ====================
+
+# Cada transacción que escribe eventos, galería, patrocinadores o hero toma la siguiente
+# versión de un contador global (sync_state) y la guarda en las filas que toca; los borrados
+# dejan una lápida (tombstones). Con ?since=<versión> los listados devuelven solo lo nuevo.
+SYNCED_MODELS = (Event, GalleryItem, Sponsor, HeroSettings)
+SYNC_MAX_CHANGES = 500
+SYNC_KEEPALIVE = 15
+SYNC_RETRY_MS = 3000
+# Reconexión (con jitter) cuando no quedan huecos para streams: el cliente sondea a este ritmo
+SYNC_BUSY_RETRY_MS = 10000
+
+def next_sync_version(session):
+    # Una versión por transacción. El UPDATE bloquea la fila hasta el commit, así que las
+    # versiones se confirman en orden y ningún cliente se salta una escritura concurrente.
+    version = session.info.get('sync_version')
+    if version is None:
+        connection = session.connection()
+        bumped = connection.execute(
+            db.update(SyncState).where(SyncState.id == 1).values(version=SyncState.version + 1)
+        )
+        if bumped.rowcount == 0:
+            connection.execute(db.insert(SyncState).values(id=1, version=1))
+        version = connection.execute(db.select(SyncState.version).where(SyncState.id == 1)).scalar_one()
+        session.info['sync_version'] = version
+    return version
+
+def current_sync_version():
+    return db.session.query(SyncState.version).filter(SyncState.id == 1).scalar() or 0
+
+class SharedVersion:
+    """Última versión confirmada, en un archivo mapeado en memoria por todos los workers.
+
+    Cada commit la sube tras confirmar, así que nunca va por delante de sync_state. Al abrirse
+    en un proceso se alinea con la base (bajo flock), lo que también corrige un archivo que
+    quedó por delante tras restaurar una copia de seguridad.
+    """
+
+    SIZE = 8
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # Perezoso y con app context: la primera lectura de cada app consulta sync_state
+        with self._lock:
+            if self._map is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a+b') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        if os.fstat(f.fileno()).st_size < self.SIZE:
+                            f.truncate(self.SIZE)
+                        mapped = mmap.mmap(f.fileno(), self.SIZE)
+                        struct.pack_into('<q', mapped, 0, current_sync_version())
+                    finally:
+                        # mmap duplica el descriptor: sin desbloquear, el flock seguiría tomado
+                        fcntl.flock(f, fcntl.LOCK_UN)
+                self._map = mapped
+        return self._map
+
+    def get(self):
+        mapped = self._map or self._open()
+        # Sin lock al leer: se repite hasta obtener dos lecturas iguales (nunca una a medias)
+        version = struct.unpack_from('<q', mapped, 0)[0]
+        while True:
+            again = struct.unpack_from('<q', mapped, 0)[0]
+            if again == version:
+                return version
+            version = again
+
+    def publish(self, version):
+        # Desde after_commit, donde no se puede consultar la base: se escribe en el archivo sin
+        # mapearlo. Descriptor propio en cada escritura (un flock sobre uno heredado del master
+        # no excluiría a los demás workers).
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            current = os.pread(fd, self.SIZE, 0)
+            if len(current) < self.SIZE or struct.unpack('<q', current)[0] < version:
+                os.pwrite(fd, struct.pack('<q', version), 0)
+        finally:
+            os.close(fd)
+
+shared_version = app_state('shared_version')
+
+def request_sync_version():
+    # Versión con la que se sirve esta petición, leída una sola vez: la de la réplica elegida
+    # por @read_replica, la del archivo compartido o, sin él, la de sync_state
+    version = g.get('read_version')
+    if version is None:
+        version = shared_version.get() if shared_version else current_sync_version()
+        g.read_version = version
+    return version
+
+@sa_event.listens_for(Session, 'before_flush')
+def _stamp_sync_versions(session, flush_context, instances):
+    changed = [o for o in session.new if isinstance(o, SYNCED_MODELS)]
+    changed += [o for o in session.dirty if isinstance(o, SYNCED_MODELS) and session.is_modified(o)]
+    deleted = [o for o in session.deleted if isinstance(o, SYNCED_MODELS)]
+    if not changed and not deleted:
+        return
+    version = next_sync_version(session)
+    for obj in changed:
+        obj.version = version
+    for obj in deleted:
+        session.add(Tombstone(entity=obj.__tablename__, entity_id=obj.id, version=version))
+    # Los elementos de galería llevan el título de su evento: al renombrarlo cambian también
+    retitled = [o.id for o in changed if isinstance(o, Event) and o.id is not None
+                and sa_inspect(o).attrs.title.history.has_changes()]
+    if retitled:
+        session.connection().execute(
+            db.update(GalleryItem.__table__).where(GalleryItem.event_id.in_(retitled)).values(version=version)
+        )
+
+@sa_event.listens_for(Session, 'after_commit')
+def _publish_sync_version(session):
+    version = session.info.pop('sync_version', None)
+    if version is not None:
+        if has_request_context():
+            g.written_version = version
+        if has_app_context():
+            change_broadcaster.publish(version)
+            if shared_version:
+                shared_version.publish(version)
+            snapshot_publisher.schedule(current_app._get_current_object())
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_sync_version(session):
+    session.info.pop('sync_version', None)
+
+def sync_since():
+    # None sin ?since=; ValueError si no es un entero
+    since = request.args.get('since')
+    return None if since is None else int(since)
+
+def sync_reset_needed(since):
+    # Las lápidas hasta pruned_version ya no existen: el delta se perdería los borrados
+    pruned = db.session.query(SyncState.pruned_version).filter(SyncState.id == 1).scalar() or 0
+    return since < pruned
+
+def prune_tombstones(max_age):
+    """Borra las lápidas más antiguas que max_age segundos; devuelve cuántas."""
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    pruned = db.session.query(db.func.max(Tombstone.version)).filter(Tombstone.created_at < cutoff).scalar()
+    if pruned is None:
+        return 0
+    # Primero el horizonte y después el borrado, en la misma transacción
+    db.session.execute(
+        db.update(SyncState).where(SyncState.id == 1, SyncState.pruned_version < pruned).values(pruned_version=pruned)
+    )
+    removed = db.session.query(Tombstone).filter(Tombstone.version <= pruned) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+def deleted_since(entity, since):
+    rows = db.session.query(Tombstone.entity_id) \
+        .filter(Tombstone.entity == entity, Tombstone.version > since).order_by(Tombstone.version)
+    return [str(r.entity_id) for r in rows]
+
+class ChangeBroadcaster:
+    """Difunde la última versión a los streams SSE abiertos en este proceso.
+
+    Los commits locales se publican al instante; los de otros workers se detectan con un
+    hilo que consulta sync_state mientras haya suscriptores.
+    """
+
+    def __init__(self, budget, max_streams, poll_interval):
+        self.budget = budget
+        self.max_streams = max_streams
+        self.poll_interval = poll_interval
+        self.version = None
+        self.subscribers = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def publish(self, version):
+        with self._condition:
+            if self.version is None or version > self.version:
+                self.version = version
+                self._condition.notify_all()
+
+    def subscribe(self, app):
+        # Cada stream ocupa un hilo del worker: por encima del límite (o sin hilos libres
+        # en el presupuesto de peticiones largas, sin contar los reservados) se rechaza
+        with self._condition:
+            if self.subscribers >= self.max_streams or not self.budget.take(stream=True):
+                return False
+            self.subscribers += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll, args=(app,), daemon=True)
+                self._thread.start()
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+        self.budget.give_back()
+
+    def wait(self, known, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self.version is not None and self.version > known, timeout)
+            return self.version
+
+    def _poll(self, app):
+        while True:
+            with self._condition:
+                if self.subscribers == 0:
+                    self._thread = None
+                    return
+            try:
+                with app.app_context():
+                    self.publish(current_sync_version())
+            except Exception as e:
+                logger.warning("No se pudo consultar la versión de sincronización: %s", e)
+            time.sleep(self.poll_interval)
+
+change_broadcaster = app_state('change_broadcaster')
+
+# ==================== RÉPLICAS DE LECTURA ====================
+
+# Los GET públicos marcados con @read_replica leen de una réplica al azar entre las sanas.
+# Lectura de lo propio: tras una escritura la respuesta lleva la cookie quibd_written (versión
+# confirmada) y solo se usa una réplica que ya la tenga aplicada; si no, se lee del primario.
+REPLICA_BIND_PREFIX = 'replica_'
+WRITE_VERSION_COOKIE = 'quibd_written'
+
+# Réplica -> instante (monotonic) hasta el que no se vuelve a intentar
+replica_down_until = app_state('replica_down_until')
+
+def written_version():
+    try:
+        return int(request.cookies.get(WRITE_VERSION_COOKIE, 0))
+    except ValueError:
+        return 0
+
+def choose_read_bind():
+    # Engine de réplica para esta petición, o None para leer del primario
+    now = time.monotonic()
+    keys = [key for key in current_app.config['SQLALCHEMY_BINDS']
+            if key.startswith(REPLICA_BIND_PREFIX) and replica_down_until.get(key, 0) <= now]
+    # Versión mínima: la escrita por este cliente o la última confirmada en este proceso
+    required = max(written_version(), change_broadcaster.version or 0)
+    random.shuffle(keys)
+    for key in keys:
+        engine = db.engines[key]
+        try:
+            # La misma consulta comprueba que la réplica responde y cuánto lleva de retraso
+            replica_version = db.session.execute(
+                db.select(SyncState.version).where(SyncState.id == 1), bind_arguments={'bind': engine}
+            ).scalar() or 0
+        except DBAPIError as e:
+            db.session.rollback()
+            replica_down_until[key] = now + current_app.config['REPLICA_RETRY_INTERVAL']
+            request_metrics.increment('replica_failures')
+            logger.warning("Réplica %s no disponible, se lee del primario: %s", key, e)
+            continue
+        if replica_version >= required:
+            g.read_version = replica_version
+            return engine
+    return None
+
+def read_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config['SQLALCHEMY_BINDS']:
+            g.read_bind = choose_read_bind()
+        return view(*args, **kwargs)
+    return wrapper
+
+@bp.after_app_request
+def set_written_version_cookie(response):
+    version = g.pop('written_version', None)
+    if version is not None and current_app.config['SQLALCHEMY_BINDS']:
+        response.set_cookie(
+            WRITE_VERSION_COOKIE, str(version),
+            max_age=current_app.config['REPLICA_STICKY_SECONDS'], httponly=True, samesite='Lax'
+        )
+    return response
+
+@bp.teardown_app_request
+def forget_read_bind(exc):
+    # g vive en el contexto de aplicación, que puede sobrevivir a la petición (CLI, pruebas)
+    g.pop('read_bind', None)
+    g.pop('read_version', None)
+
+# ==================== ALMACENAMIENTO ====================
+
+# Cada archivo se guarda una sola vez bajo su SHA-256 (objects/ab/<sha>.<ext>). stored_files
+# cuenta cuántos registros lo usan; cuando el contador llega a 0 el archivo se borra.
+
+StoredUpload = namedtuple('StoredUpload', ['sha256', 'url', 'size', 'filename', 'crc32'], defaults=(None,))
+CONTENT_ADDRESS_RE = re.compile(r'/objects/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$')
+OBJECTS_LOCK_FILE = '.objects.lock'
+
+def file_digest(path):
+    # SHA-256, tamaño y CRC-32 en una sola lectura
+    digest = hashlib.sha256()
+    size = 0
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(CHUNK_READ_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+    return digest.hexdigest(), size, crc
+
+class BaseStorage:
+    def __init__(self, tmp_folder):
+        self.tmp_folder = tmp_folder
+
+    def key_for(self, sha256, extension):
+        return f"objects/{sha256[:2]}/{sha256}.{extension}"
+
+    def spool(self, stream):
+        # Copia el stream a un temporal en bloques acotados mientras calcula el SHA-256 y el CRC-32
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        crc = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    block = stream.read(CHUNK_READ_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    crc = zlib.crc32(block, crc)
+                    size += len(block)
+                    f.write(block)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size, crc
+
+    def local_path(self, url):
+        return None
+
+    def size(self, url):
+        return None
+
+    def read(self, url, start=0, length=None):
+        raise NotImplementedError
+
+class LocalStorage(BaseStorage):
+    def __init__(self, root, url_prefix='/uploads'):
+        # El temporal vive en el mismo sistema de archivos para que os.replace sea atómico
+        super().__init__(os.path.join(root, '.tmp'))
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def url_for(self, key):
+        return f"{self.url_prefix}/{key}"
+
+    def local_path(self, url):
+        if not url or not url.startswith(self.url_prefix + '/'):
+            return None
+        return safe_join(self.root, url[len(self.url_prefix) + 1:])
+
+    def objects_lock(self):
+        # Serializa "reutilizar" frente a "borrar" un objeto entre hilos y workers
+        os.makedirs(self.root, exist_ok=True)
+        lock = open(os.path.join(self.root, OBJECTS_LOCK_FILE), 'w')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def put_file(self, path, sha256, extension):
+        # Mueve `path` a su dirección de contenido; si ya existe, el duplicado se descarta
+        key = self.key_for(sha256, extension)
+        target = os.path.join(self.root, key)
+        with self.objects_lock():
+            if os.path.exists(target):
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(path, target)
+            # Renueva el plazo de gracia (también al mover: os.replace conserva la fecha de la
+            # parte): ni delete_if_idle ni el recolector lo tocan antes de confirmar su referencia
+            os.utime(target)
+        return self.url_for(key)
+
+    def last_used(self, url):
+        path = self.local_path(url)
+        try:
+            return os.path.getmtime(path) if path else None
+        except FileNotFoundError:
+            return None
+
+    def delete_if_idle(self, url, grace_period):
+        # Una subida que reutilizó el archivo hace menos de `grace_period` pudo pasar put_file
+        # sin haber confirmado aún su referencia: ese archivo se deja para el recolector
+        with self.objects_lock():
+            used = self.last_used(url)
+            if used is not None and used > time.time() - grace_period:
+                return False
+            self.delete(url)
+            return True
+
+    def size(self, url):
+        path = self.local_path(url)
+        return os.path.getsize(path) if path and os.path.isfile(path) else None
+
+    def read(self, url, start=0, length=None):
+        # Bloques de `length` bytes (o hasta el final) a partir de `start`
+        with open(self.local_path(url), 'rb') as f:
+            f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                block = f.read(CHUNK_READ_SIZE if remaining is None else min(CHUNK_READ_SIZE, remaining))
+                if not block:
+                    break
+                if remaining is not None:
+                    remaining -= len(block)
+                yield block
+
+    def delete(self, url):
+        path = self.local_path(url)
+        if not path:
+            return
+        for candidate in [path] + variant_paths(path):
+            if os.path.exists(candidate):
+                os.remove(candidate)
+
+class S3Storage(BaseStorage):
+    def __init__(self, bucket, endpoint_url=None, public_url=None):
+        if boto3 is None:
+            raise RuntimeError('STORAGE_BACKEND=s3 requiere boto3')
+        super().__init__(os.path.join(tempfile.gettempdir(), 'quibd-uploads'))
+        self.bucket = bucket
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.public_url = (public_url or f"{endpoint_url}/{bucket}").rstrip('/')
+
+    def url_for(self, key):
+        return f"{self.public_url}/{key}"
+
+    def put_file(self, path, sha256, extension):
+        key = self.key_for(sha256, extension)
+        extra_args = {
+            'ContentType': mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            'CacheControl': f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        }
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            self.client.upload_file(path, self.bucket, key, ExtraArgs=extra_args)
+        else:
+            # Copia sobre sí mismo: renueva LastModified, que delete_if_idle respeta
+            self.client.copy_object(
+                Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': key},
+                MetadataDirective='REPLACE', **extra_args
+            )
+        os.remove(path)
+        return self.url_for(key)
+
+    def key_from_url(self, url):
+        return url[len(self.public_url) + 1:] if url and url.startswith(self.public_url + '/') else None
+
+    def size(self, url):
+        key = self.key_from_url(url)
+        if not key:
+            return None
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+        except ClientError:
+            return None
+
+    def read(self, url, start=0, length=None):
+        end = '' if length is None else start + length - 1
+        body = self.client.get_object(Bucket=self.bucket, Key=self.key_from_url(url), Range=f"bytes={start}-{end}")['Body']
+        yield from body.iter_chunks(CHUNK_READ_SIZE)
+
+    def delete(self, url):
+        key = self.key_from_url(url)
+        if key:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def last_used(self, url):
+        key = self.key_from_url(url)
+        if not key:
+            return None
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['LastModified'].timestamp()
+        except ClientError:
+            return None
+
+    def delete_if_idle(self, url, grace_period):
+        # Sin bloqueo entre procesos en S3: la marca de put_file reduce la ventana a la de la consulta
+        used = self.last_used(url)
+        if used is not None and used > time.time() - grace_period:
+            return False
+        self.delete(url)
+        return True
+
+def create_storage(config):
+    if config['STORAGE_BACKEND'] == 's3':
+        return S3Storage(config['S3_BUCKET'], config['S3_ENDPOINT_URL'], config['S3_PUBLIC_URL'])
+    return LocalStorage(config['UPLOAD_FOLDER'])
+
+def get_storage():
+    return current_app.extensions['storage']
+
+def store_upload(file, storage=None):
+    # storage explícito para poder llamarse desde hilos sin app context (subida masiva)
+    storage = storage or get_storage()
+    filename = secure_filename(file.filename)
+    tmp_path, sha256, size, crc = storage.spool(file.stream)
+    url = storage.put_file(tmp_path, sha256, filename.rsplit('.', 1)[-1].lower())
+    return StoredUpload(sha256, url, size, filename, crc)
+
+def add_references(uploads, weight=1):
+    # Upsert de los contadores dentro de la transacción en curso (se confirma con el registro)
+    counts = {}
+    for upload in uploads:
+        counts.setdefault(upload.sha256, [0, upload])[0] += weight
+    if not counts:
+        return
+    rows = [
+        {'sha256': sha256, 'url': upload.url, 'size': upload.size, 'crc32': upload.crc32, 'ref_count': total}
+        for sha256, (total, upload) in counts.items()
+    ]
+    dialect = db.session.get_bind().dialect.name
+    # Las filas anteriores a la columna crc32 la completan con la siguiente subida del mismo contenido
+    if dialect == 'mysql':
+        stmt = mysql_insert(StoredFile).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            ref_count=StoredFile.ref_count + stmt.inserted.ref_count,
+            crc32=db.func.coalesce(StoredFile.crc32, stmt.inserted.crc32)
+        )
+    else:
+        stmt = (postgresql_insert if dialect == 'postgresql' else sqlite_insert)(StoredFile).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['sha256'],
+            set_={
+                'ref_count': StoredFile.ref_count + stmt.excluded.ref_count,
+                'crc32': db.func.coalesce(StoredFile.crc32, stmt.excluded.crc32)
+            }
+        )
+    db.session.execute(stmt)
+
+def release_reference(url):
+    # Las URLs antiguas (con fecha, sin dirección de contenido) no llevan contador
+    released = release_references([url])
+    return released[0] if released else None
+
+def release_references(urls):
+    # Resta una referencia por URL en un solo UPDATE (executemany); devuelve los hashes tocados
+    counts = {}
+    for url in urls:
+        match = CONTENT_ADDRESS_RE.search(url or '')
+        if match:
+            counts[match.group(1)] = counts.get(match.group(1), 0) + 1
+    if counts:
+        table = StoredFile.__table__
+        db.session.execute(
+            db.update(table).where(table.c.sha256 == db.bindparam('sha'))
+            .values(ref_count=table.c.ref_count - db.bindparam('released')),
+            [{'sha': sha256, 'released': total} for sha256, total in counts.items()]
+        )
+    return list(counts)
+
+def reclaim_files(hashes):
+    # Después del commit: borra los archivos cuyo contador quedó en 0. Los reutilizados dentro
+    # del plazo de gracia conservan su fila a 0 y los decide el recolector cuando venza.
+    storage = get_storage()
+    grace_period = current_app.config['GC_GRACE_PERIOD']
+    for sha256 in {h for h in hashes if h}:
+        try:
+            url = db.session.execute(
+                db.select(StoredFile.url).where(StoredFile.sha256 == sha256, StoredFile.ref_count <= 0)
+            ).scalar()
+            if url is None:
+                continue
+            used = storage.last_used(url)
+            if used is not None and used > time.time() - grace_period:
+                db.session.rollback()
+                continue
+            # Borrado condicional: si otra subida lo volvió a referenciar, no se toca
+            deleted = db.session.execute(
+                db.delete(StoredFile).where(StoredFile.sha256 == sha256, StoredFile.ref_count <= 0)
+            ).rowcount
+            db.session.commit()
+            if deleted:
+                storage.delete_if_idle(url, grace_period)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("No se pudo liberar %s: %s", sha256, e)
+
+# ==================== BORRADO EN CASCADA Y RECOLECCIÓN ====================
+
+CASCADE_BATCH_SIZE = 500
+
+# Columnas que apuntan a archivos subidos: lo que no aparece en ninguna es huérfano
+GC_REFERENCE_COLUMNS = (Event.image, GalleryItem.src, Sponsor.logo, HeroSettings.hero_video)
+GC_LOCK_FILE = '.gc.lock'
+VARIANT_NAME_RE = re.compile(r'^(.+)_\d+\.\w+$')
+
+_maintenance_executor = None
+_maintenance_executor_pid = None
+_gc_thread_pid = None
+_gc_thread_lock = threading.Lock()
+
+def maintenance_executor():
+    global _maintenance_executor, _maintenance_executor_pid
+    # Un solo hilo por worker para tareas de fondo que tocan la base de datos
+    if _maintenance_executor is None or _maintenance_executor_pid != os.getpid():
+        _maintenance_executor = ThreadPoolExecutor(max_workers=1)
+        _maintenance_executor_pid = os.getpid()
+    return _maintenance_executor
+
+def run_in_background(func, *args):
+    app = current_app._get_current_object()
+
+    def task():
+        with app.app_context():
+            try:
+                func(*args)
+            except Exception as e:
+                logger.warning("Tarea de mantenimiento fallida (%s): %s", func.__name__, e)
+    return maintenance_executor().submit(task)
+
+def delete_event_gallery(event_id):
+    # Borra la galería del evento en lotes, cada uno en su propia transacción corta:
+    # ninguna bloquea gallery_items mucho tiempo. Devuelve los hashes liberados.
+    released = []
+    while True:
+        rows = db.session.query(GalleryItem.id, GalleryItem.src) \
+            .filter(GalleryItem.event_id == event_id).order_by(GalleryItem.id).limit(CASCADE_BATCH_SIZE).all()
+        if not rows:
+            return released
+        ids = [r.id for r in rows]
+        # DELETE masivo: sin before_flush, así que versión y lápidas se escriben aquí
+        version = next_sync_version(db.session)
+        db.session.execute(db.insert(Tombstone), [
+            {'entity': GalleryItem.__tablename__, 'entity_id': item_id, 'version': version} for item_id in ids
+        ])
+        released += release_references([r.src for r in rows])
+        db.session.execute(db.delete(GalleryItem.__table__).where(GalleryItem.id.in_(ids)))
+        db.session.commit()
+        response_cache.invalidate('gallery', 'stats')
+
+def still_referenced(urls):
+    # Comprobación final justo antes de borrar: una subida pudo confirmarse mientras tanto
+    found = set()
+    for column in GC_REFERENCE_COLUMNS:
+        found.update(url for (url,) in db.session.query(column).filter(column.in_(urls)))
+    hashes = {m.group(1): url for url in urls if (m := CONTENT_ADDRESS_RE.search(url))}
+    if hashes:
+        rows = db.session.query(StoredFile.sha256) \
+            .filter(StoredFile.sha256.in_(list(hashes)), StoredFile.ref_count > 0)
+        found.update(hashes[sha256] for (sha256,) in rows)
+    return found
+
+def orphaned_upload_files(storage, cutoff):
+    # (ruta, url) de los archivos anteriores a `cutoff` que ninguna columna referencia.
+    # Los temporales de .tmp salen con url None; los derivados se tratan con su original.
+    referenced = set()
+    for column in GC_REFERENCE_COLUMNS:
+        referenced.update(url for (url,) in db.session.query(column).filter(column.isnot(None)).distinct())
+    db.session.rollback()
+    for root, dirs, files in os.walk(storage.root):
+        relative = os.path.relpath(root, storage.root)
+        temporary = relative.split(os.sep)[0] == '.tmp'
+        dirs[:] = [d for d in dirs if d != VARIANT_FOLDER and (d == '.tmp' or not d.startswith('.'))]
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if temporary:
+                yield path, None
+            elif not filename.startswith('.'):
+                url = storage.url_for(os.path.relpath(path, storage.root).replace(os.sep, '/'))
+                if url not in referenced:
+                    yield path, url
+
+def orphaned_variant_files(storage, cutoff):
+    # Derivados cuyo original ya no existe (p. ej. de archivos borrados a mano)
+    for root, dirs, files in os.walk(storage.root):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        if os.path.basename(root) != VARIANT_FOLDER:
+            continue
+        sources = {name.rsplit('.', 1)[0] for name in os.listdir(os.path.dirname(root))}
+        for filename in files:
+            match = VARIANT_NAME_RE.match(filename)
+            path = os.path.join(root, filename)
+            if match and match.group(1) not in sources and os.path.getmtime(path) <= cutoff:
+                yield path
+
+def remove_orphans(storage, batch):
+    referenced = still_referenced([url for _, url in batch if url])
+    removed = 0
+    for path, url in batch:
+        if url in referenced:
+            continue
+        if url:
+            # Igual que reclaim_files: primero la fila (condicional), luego el archivo
+            match = CONTENT_ADDRESS_RE.search(url)
+            if match:
+                db.session.execute(
+                    db.delete(StoredFile).where(StoredFile.sha256 == match.group(1), StoredFile.ref_count <= 0)
+                )
+            db.session.commit()
+            if not storage.delete_if_idle(url, current_app.config['GC_GRACE_PERIOD']):
+                continue
+        elif os.path.exists(path):
+            os.remove(path)
+        removed += 1
+    db.session.commit()
+    return removed
+
+def collect_orphans():
+    """Una pasada del recolector; devuelve cuántos archivos se borraron.
+
+    Trabaja en lotes pequeños con pausas entre ellos, sin transacciones abiertas durante
+    el recorrido del disco. Un flock evita que dos workers recorran uploads/ a la vez.
+    """
+    config = current_app.config
+    storage = get_storage()
+    cutoff = time.time() - config['GC_GRACE_PERIOD']
+    batch_size = config['GC_BATCH_SIZE']
+    os.makedirs(config['UPLOAD_FOLDER'], exist_ok=True)
+    with open(os.path.join(config['UPLOAD_FOLDER'], GC_LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+
+        removed = 0
+        if isinstance(storage, LocalStorage):
+            batch = []
+            for candidate in orphaned_upload_files(storage, cutoff):
+                batch.append(candidate)
+                if len(batch) >= batch_size:
+                    removed += remove_orphans(storage, batch)
+                    batch = []
+                    time.sleep(config['GC_BATCH_PAUSE'])
+            removed += remove_orphans(storage, batch)
+            for path in orphaned_variant_files(storage, cutoff):
+                os.remove(path)
+                removed += 1
+        else:
+            # Sin disco que recorrer: los objetos sin referencias salen de stored_files
+            while True:
+                stale = [sha256 for (sha256,) in db.session.query(StoredFile.sha256).filter(
+                    StoredFile.ref_count <= 0, StoredFile.created_at < datetime.utcfromtimestamp(cutoff)
+                ).limit(batch_size)]
+                if not stale:
+                    break
+                reclaim_files(stale)
+                removed += len(stale)
+                time.sleep(config['GC_BATCH_PAUSE'])
+        # Subidas por partes abandonadas (y los metadatos de las ya completadas)
+        for path in expired_chunk_uploads(config['CHUNK_UPLOAD_FOLDER'], time.time() - config['CHUNK_UPLOAD_TTL']):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        prune_tombstones(config['SYNC_TOMBSTONE_RETENTION'])
+        db.session.remove()
+    request_metrics.increment('gc_files_removed', removed)
+    return removed
+
+def gc_loop(app):
+    while True:
+        # Con jitter para que los workers no coincidan
+        time.sleep(app.config['GC_INTERVAL'] * (0.75 + 0.5 * (os.getpid() % 100) / 100))
+        try:
+            with app.app_context():
+                removed = collect_orphans()
+            if removed:
+                logger.info("Recolector: %d archivos huérfanos eliminados", removed)
+        except Exception as e:
+            logger.warning("Recolector de archivos fallido: %s", e)
+
+@bp.before_app_request
+def start_upload_gc():
+    # Un hilo por worker, arrancado en su primera petición (un hilo no sobrevive al fork)
+    global _gc_thread_pid
+    if _gc_thread_pid == os.getpid() or current_app.config['GC_INTERVAL'] <= 0:
+        return
+    with _gc_thread_lock:
+        if _gc_thread_pid != os.getpid():
+            _gc_thread_pid = os.getpid()
+            threading.Thread(target=gc_loop, args=(current_app._get_current_object(),), daemon=True).start()
+
+@bp.cli.command('gc-uploads')
+def gc_uploads_command():
+    removed = collect_orphans()
+    print(f"✅ Archivos huérfanos eliminados: {removed}")
+
+# ==================== REGISTROS ====================
+
+# Lógica compartida entre la subida multipart clásica y la subida por partes (/api/uploads)
+
+def create_event_record(form, image):
+    new_event = Event(
+        title=form.get('title'),
+        date=form.get('date'),
+        description=form.get('description'),
+        category=form.get('category', 'evento'),
+        featured=form.get('featured') == 'true',
+        image=image.url if image else None
+    )
+    db.session.add(new_event)
+    if image:
+        add_references([image])
+    db.session.commit()
+    response_cache.invalidate('events', 'stats')
+    return jsonify({'status': 'success', 'event': new_event.to_dict()}), 201
+
+def create_gallery_record(upload, form):
+    new_item = GalleryItem(
+        src=upload.url,
+        alt=upload.filename,
+        event_id=form.get('event_id'),
+        year=form.get('year'),
+        type=form.get('type', 'image')
+    )
+    db.session.add(new_item)
+    add_references([upload])
+    db.session.commit()
+    response_cache.invalidate('gallery', 'stats')
+    row = gallery_rows().filter(GalleryItem.id == new_item.id).one()
+    return jsonify({'status': 'success', 'item': gallery_row_to_dict(row)}), 201
+
+def create_sponsor_record(logo, form):
+    new_sponsor = Sponsor(
+        name=form.get('name'),
+        logo=logo.url,
+        tier=form.get('tier')
+    )
+    db.session.add(new_sponsor)
+    add_references([logo])
+    db.session.commit()
+    response_cache.invalidate('sponsors', 'stats')
+    return jsonify({'status': 'success', 'sponsor': new_sponsor.to_dict()}), 201
+
+def hero_settings_dict(settings):
+    # Sin fila (base recién creada) los GET devuelven los valores por defecto sin escribir nada
+    return settings.to_dict() if settings else {
+        'id': None, 'heroVideo': '', 'eventDate': DEFAULT_EVENT_DATE, 'version': 0, 'updated_at': None
+    }
+
+def editable_hero_settings():
+    # La fila se crea con la primera escritura, nunca desde un GET
+    settings = HeroSettings.query.first()
+    if not settings:
+        settings = HeroSettings(hero_video='', event_date=DEFAULT_EVENT_DATE)
+        db.session.add(settings)
+    return settings
+
+def set_hero_video(video):
+    settings = editable_hero_settings()
+    released = release_reference(settings.hero_video)
+    settings.hero_video = video.url
+    add_references([video])
+    db.session.commit()
+    response_cache.invalidate('hero')
+    reclaim_files([released])
+    return jsonify({'status': 'success', 'url': settings.hero_video})
+
 # ==================== RUTAS DE ARCHIVOS ====================
 
-@app.route('/uploads/<path:filename>')
+# Los archivos con prefijo de fecha (y sus derivados) nunca cambian de contenido: caché de un año
+IMMUTABLE_UPLOAD_RE = re.compile(r'^((hero_)?\d{8}_\d{6}_|[0-9a-f]{64})')
+IMMUTABLE_MAX_AGE = 31536000
+UPLOAD_MAX_AGE = 3600
+
+@bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # conditional=True: ETag/Last-Modified, 304 para If-None-Match/If-Modified-Since y Range -> 206
+    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, conditional=True)
+    if IMMUTABLE_UPLOAD_RE.match(os.path.basename(filename)):
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = UPLOAD_MAX_AGE
+    response.cache_control.public = True
+    response.cache_control.no_cache = None
 
-@app.route('/api/upload/<category>', methods=['POST'])
+    # Bajo gunicorn, un rango (206) también se envía con sendfile: se posiciona el archivo
+    # en el inicio del rango y gunicorn limita la copia a Content-Length
+    if (response.status_code == 206 and not response.headers.get('X-Sendfile')
+            and request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/')):
+        start = response.content_range.start
+        path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+        f = open(path, 'rb')
+        f.seek(start)
+        response.response.close()
+        response.response = request.environ['wsgi.file_wrapper'](f)
+    return response
+
+@bp.route('/api/upload/<category>', methods=['POST'])
 def upload_file(category):
+    # Con almacenamiento por contenido la categoría ya no forma parte de la ruta del archivo
     try:
         if 'file' not in request.files:
             return jsonify({'status': 'error', 'message': 'No file sent'}), 400
         file = request.files['file']
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], category)
-            if not os.path.exists(save_path): os.makedirs(save_path)
-            
-            file.save(os.path.join(save_path, filename))
-            return jsonify({'status': 'success', 'url': f"/uploads/{category}/{filename}"}), 201
+            upload = store_upload(file)
+            # Sin registro que lo use: queda con 0 referencias
+            add_references([upload], weight=0)
+            db.session.commit()
+            schedule_variants(get_storage().local_path(upload.url))
+            return jsonify({'status': 'success', 'url': upload.url}), 201
         return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# ==================== SUBIDA POR PARTES (REANUDABLE) ====================
+
+# Protocolo: POST /api/uploads (init) -> PATCH /api/uploads/<id> con Upload-Offset (append)
+# -> POST /api/uploads/<id>/complete. GET /api/uploads/<id> devuelve el offset confirmado para reanudar.
+
+CHUNK_READ_SIZE = 1024 * 1024
+
+# destino -> registro que recibe el archivo final
+UPLOAD_TARGETS = {
+    'hero': lambda upload, form: set_hero_video(upload),
+    'gallery': create_gallery_record,
+    'sponsor': create_sponsor_record,
+    'event': lambda upload, form: create_event_record(form, upload),
+}
+
+def chunk_paths(upload_id):
+    # upload_id llega por URL: solo se aceptan ids generados por uuid4().hex
+    if len(upload_id) != 32 or not all(c in '0123456789abcdef' for c in upload_id):
+        return None, None
+    folder = current_app.config['CHUNK_UPLOAD_FOLDER']
+    return os.path.join(folder, f"{upload_id}.part"), os.path.join(folder, f"{upload_id}.json")
+
+def load_chunk_upload(upload_id):
+    part_path, meta_path = chunk_paths(upload_id)
+    if not meta_path or not os.path.exists(meta_path):
+        return None, None, None
+    with open(meta_path) as f:
+        return json.load(f), part_path, meta_path
+
+def save_chunk_meta(meta_path, meta):
+    # Reemplazo atómico: GET y PATCH leen el JSON sin bloqueo
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def expired_chunk_uploads(folder, cutoff):
+    # Archivos de las subidas cuyo último cambio (parte, metadatos o cierre) es anterior a `cutoff`
+    if not os.path.isdir(folder):
+        return []
+    uploads = {}
+    for filename in os.listdir(folder):
+        path = os.path.join(folder, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            continue
+        paths, newest = uploads.get(filename.split('.', 1)[0], ([], 0))
+        uploads[filename.split('.', 1)[0]] = (paths + [path], max(newest, mtime))
+    return [path for paths, newest in uploads.values() if newest <= cutoff for path in paths]
+
+@bp.route('/api/uploads', methods=['POST'])
+def init_chunk_upload():
+    try:
+        data = request.get_json() or {}
+        filename = data.get('filename', '')
+        target = data.get('target')
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Invalid size'}), 400
+        if target not in UPLOAD_TARGETS:
+            return jsonify({'status': 'error', 'message': 'Invalid upload target'}), 400
+        if not allowed_file(filename) or size <= 0:
+            return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
+        if size > current_app.config['CHUNKED_UPLOAD_MAX_SIZE']:
+            return jsonify({'status': 'error', 'message': 'File too large'}), 413
+
+        upload_id = uuid.uuid4().hex
+        folder = current_app.config['CHUNK_UPLOAD_FOLDER']
+        if not os.path.exists(folder): os.makedirs(folder)
+        part_path, meta_path = chunk_paths(upload_id)
+        open(part_path, 'wb').close()
+        save_chunk_meta(meta_path, {'filename': secure_filename(filename), 'size': size, 'target': target})
+        return jsonify({'status': 'success', 'upload_id': upload_id, 'offset': 0, 'chunk_size': CHUNK_READ_SIZE}), 201
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_chunk_upload(upload_id):
+    meta, part_path, _ = load_chunk_upload(upload_id)
+    if meta is None:
+        return jsonify({'status': 'error', 'message': 'Upload not found'}), 404
+    return jsonify({
+        'status': 'success',
+        'upload_id': upload_id,
+        # Tras el complete la parte ya está en el almacenamiento
+        'offset': meta['size'] if 'stored' in meta else os.path.getsize(part_path),
+        'size': meta['size']
+    })
+
+@bp.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def append_chunk_upload(upload_id):
+    try:
+        meta, part_path, _ = load_chunk_upload(upload_id)
+        if meta is None:
+            return jsonify({'status': 'error', 'message': 'Upload not found'}), 404
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Missing Upload-Offset header'}), 400
+        if 'stored' in meta:
+            return jsonify({'status': 'error', 'message': 'Upload already completed', 'offset': meta['size']}), 409
+
+        with open(part_path, 'ab') as f:
+            # Bloqueo exclusivo: dos PATCH simultáneos al mismo upload no pueden intercalarse
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                return jsonify({'status': 'error', 'message': 'Offset mismatch', 'offset': current}), 409
+            written = 0
+            # Se copia el cuerpo en bloques acotados directamente a disco, sin cargarlo en memoria
+            while True:
+                block = request.stream.read(CHUNK_READ_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if current + written > meta['size']:
+                    f.truncate(current)
+                    return jsonify({'status': 'error', 'message': 'Chunk exceeds declared size', 'offset': current}), 413
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        return jsonify({'status': 'success', 'offset': current + written, 'size': meta['size']})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunk_upload(upload_id):
+    # Idempotente: un reintento o doble envío devuelve el mismo registro en lugar de crear otro
+    try:
+        _, meta_path = chunk_paths(upload_id)
+        if not meta_path or not os.path.exists(meta_path):
+            return jsonify({'status': 'error', 'message': 'Upload not found'}), 404
+        with open(f"{os.path.splitext(meta_path)[0]}.lock", 'w') as lock:
+            # Un complete a la vez por subida; los metadatos se releen ya con el bloqueo
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            meta, part_path, meta_path = load_chunk_upload(upload_id)
+            if meta is None:
+                return jsonify({'status': 'error', 'message': 'Upload not found'}), 404
+            if 'result' in meta:
+                return jsonify(meta['result']['body']), meta['result']['status']
+
+            storage = get_storage()
+            if 'stored' in meta:
+                # Un intento anterior ya movió el archivo pero no llegó a crear el registro
+                upload = StoredUpload(**meta['stored'])
+            else:
+                offset = os.path.getsize(part_path)
+                if offset != meta['size']:
+                    return jsonify({'status': 'error', 'message': 'Upload incomplete', 'offset': offset}), 409
+                sha256, size, crc = file_digest(part_path)
+                # Primero el archivo en su dirección de contenido: si falla (p. ej. S3), la parte
+                # sigue en disco y no existe aún ningún registro que apunte a un objeto ausente
+                url = storage.put_file(part_path, sha256, meta['filename'].rsplit('.', 1)[-1].lower())
+                upload = StoredUpload(sha256, url, size, meta['filename'], crc)
+                meta['stored'] = upload._asdict()
+                save_chunk_meta(meta_path, meta)
+            try:
+                response = current_app.make_response(UPLOAD_TARGETS[meta['target']](upload, request.form))
+            except Exception:
+                db.session.rollback()
+                raise
+            meta['result'] = {'status': response.status_code, 'body': response.get_json()}
+            save_chunk_meta(meta_path, meta)
+        schedule_variants(storage.local_path(upload.url))
+        return response
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# ==================== BÚSQUEDA ====================
+
+# En MySQL la búsqueda usa los índices FULLTEXT (la colación *_ci ya ignora tildes);
+# en SQLite u otros motores, un índice invertido en memoria con la misma normalización.
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_TOKEN_RE = re.compile(r'[^\W_]+')
+SEARCH_STOPWORDS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'se', 'su', 'un', 'una', 'y',
+))
+
+def fold_text(text):
+    # "Quibdó" -> "quibdo": sin tildes ni mayúsculas
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def search_terms(text):
+    return [t for t in SEARCH_TOKEN_RE.findall(fold_text(text)) if t not in SEARCH_STOPWORDS]
+
+def mysql_boolean_query(terms):
+    # Sin operadores: cualquier término suma relevancia y el último se busca como prefijo
+    return ' '.join(terms[:-1] + [terms[-1] + '*'])
+
+class SearchIndex:
+    """Índice invertido en memoria con puntuación TF-IDF ponderada por campo.
+
+    Se reconstruye cuando la versión de sync_state supera la del último índice (escrituras
+    de cualquier worker) o cuando vence el TTL.
+    """
+
+    def __init__(self, loader, weights):
+        self.loader = loader
+        self.weights = weights
+        self._postings = {}
+        self._vocabulary = []
+        self._attributes = {}
+        self._version = None
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        postings = {}
+        attributes = {}
+        for doc_id, fields, attrs in self.loader():
+            attributes[doc_id] = attrs
+            for field, weight in self.weights.items():
+                for term in search_terms(fields.get(field)):
+                    doc_weights = postings.setdefault(term, {})
+                    doc_weights[doc_id] = doc_weights.get(doc_id, 0) + weight
+        return postings, sorted(postings), attributes
+
+    def _fresh(self, version):
+        return self._version is not None and version <= self._version and time.monotonic() < self._expires
+
+    def _refresh(self):
+        version = request_sync_version()
+        if self._fresh(version):
+            return
+        with self._lock:
+            if self._fresh(version):
+                return
+            self._postings, self._vocabulary, self._attributes = self._build()
+            self._version = version
+            self._expires = time.monotonic() + response_cache.ttl
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self._postings else []
+        start = bisect_left(self._vocabulary, term)
+        matches = []
+        for candidate in self._vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, terms, limit, offset=0, **filters):
+        self._refresh()
+        postings, attributes = self._postings, self._attributes
+        total_docs = max(len(attributes), 1)
+        scores = {}
+        for position, term in enumerate(terms):
+            for match in self._expand(term, prefix=position == len(terms) - 1):
+                doc_weights = postings[match]
+                idf = math.log(1 + total_docs / len(doc_weights))
+                for doc_id, weight in doc_weights.items():
+                    attrs = attributes[doc_id]
+                    if any(value is not None and attrs.get(key) != value for key, value in filters.items()):
+                        continue
+                    scores[doc_id] = scores.get(doc_id, 0) + weight * idf
+        ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], -doc_id))
+        return ranked[offset:offset + limit + 1]
+
+def load_event_documents():
+    rows = db.session.query(Event.id, Event.title, Event.description, Event.category)
+    return [(r.id, {'title': r.title, 'description': r.description, 'category': r.category}, {}) for r in rows]
+
+def load_gallery_documents():
+    rows = db.session.query(GalleryItem.id, GalleryItem.alt, GalleryItem.event_id, GalleryItem.year)
+    return [(r.id, {'alt': r.alt}, {'event_id': r.event_id, 'year': r.year}) for r in rows]
+
+event_search_index = app_state('event_search_index')
+gallery_search_index = app_state('gallery_search_index')
+
+def use_fulltext():
+    return db.engine.dialect.name == 'mysql'
+
+def find_events(terms, limit, offset):
+    if not terms:
+        return [], False
+    if use_fulltext():
+        score = mysql_match(Event.title, Event.description, Event.category,
+                            against=mysql_boolean_query(terms)).in_boolean_mode()
+        ids = [r.id for r in db.session.query(Event.id).filter(score > 0)
+               .order_by(score.desc(), Event.id.desc()).offset(offset).limit(limit + 1)]
+    else:
+        ids = event_search_index.search(terms, limit, offset)
+    events = {e.id: e for e in Event.query.filter(Event.id.in_(ids[:limit]))} if ids else {}
+    return [events[i] for i in ids[:limit] if i in events], len(ids) > limit
+
+def find_gallery_items(terms, limit, offset, event_id=None, year=None):
+    if not terms:
+        return [], False
+    if use_fulltext():
+        score = mysql_match(GalleryItem.alt, against=mysql_boolean_query(terms)).in_boolean_mode()
+        query = db.session.query(GalleryItem.id).filter(score > 0)
+        if event_id is not None:
+            query = query.filter(GalleryItem.event_id == event_id)
+        if year is not None:
+            query = query.filter(GalleryItem.year == year)
+        ids = [r.id for r in query.order_by(score.desc(), GalleryItem.id.desc()).offset(offset).limit(limit + 1)]
+    else:
+        ids = gallery_search_index.search(terms, limit, offset, event_id=event_id, year=year)
+    rows = {r.id: r for r in gallery_rows().filter(GalleryItem.id.in_(ids[:limit]))} if ids else {}
+    return [rows[i] for i in ids[:limit] if i in rows], len(ids) > limit
+
+def search_params():
+    # (términos, límite, offset); ValueError si la paginación no es válida
+    terms = search_terms(request.args.get('q', ''))
+    limit = max(1, min(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT))
+    offset = max(0, int(request.args.get('offset', 0)))
+    return terms, limit, offset
+
+# ==================== EXPORTACIÓN ZIP ====================
+
+# El ZIP se genera al vuelo y nunca existe completo: todas las entradas van sin comprimir
+# (JPEG, PNG, GIF y los videos ya están comprimidos), así que el tamaño total y la posición
+# de cada byte se conocen de antemano. Eso permite Content-Length y reanudar con Range.
+ZIP_UTF8_FLAG = 0x0800
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_CRC_CACHE_SIZE = 4096
+
+ZipEntry = namedtuple('ZipEntry', ['name', 'url', 'size', 'dos_time', 'dos_date', 'crc'])
+
+# El CRC de los archivos con dirección de contenido se guarda al subirlos (stored_files.crc32);
+# solo los antiguos se leen enteros, una vez por proceso gracias a esta caché
+_zip_crc_cache = OrderedDict()
+_zip_crc_lock = threading.Lock()
+
+def zip_crc(storage, entry):
+    if entry.crc is not None:
+        return entry.crc
+    url = entry.url
+    with _zip_crc_lock:
+        if url in _zip_crc_cache:
+            _zip_crc_cache.move_to_end(url)
+            return _zip_crc_cache[url]
+    crc = 0
+    for block in storage.read(url):
+        crc = zlib.crc32(block, crc)
+    with _zip_crc_lock:
+        _zip_crc_cache[url] = crc
+        while len(_zip_crc_cache) > ZIP_CRC_CACHE_SIZE:
+            _zip_crc_cache.popitem(last=False)
+    return crc
+
+def dos_datetime(value):
+    value = max(value or datetime(1980, 1, 1), datetime(1980, 1, 1))
+    return (value.hour << 11) | (value.minute << 5) | (value.second // 2), \
+        ((value.year - 1980) << 9) | (value.month << 4) | value.day
+
+class ZipStream:
+    """Archivo ZIP (stored, con ZIP64 cuando hace falta) descrito como una lista de segmentos.
+
+    Cada segmento es (longitud, productor); iter_range() recorre solo los que caen dentro
+    del rango pedido, así que una descarga reanudada no relee los archivos anteriores.
+    """
+
+    def __init__(self, storage, entries):
+        self.storage = storage
+        self.entries = entries
+        self.segments = []
+        self._offsets = []
+        offset = 0
+        for entry in entries:
+            self._offsets.append(offset)
+            header_length = 30 + len(entry.name.encode()) + (20 if entry.size >= ZIP64_LIMIT else 0)
+            self.segments.append((header_length, self._producer(lambda e=entry: self.local_header(e))))
+            self.segments.append((entry.size, lambda lo, hi, e=entry: storage.read(e.url, lo, hi - lo)))
+            offset += header_length + entry.size
+        self.directory_offset = offset
+        self.directory_length = sum(self._directory_record_length(e, o) for e, o in zip(entries, self._offsets))
+        self.segments.append((self.directory_length, self._producer(self.central_directory)))
+        end = self.end_records()
+        self.segments.append((len(end), self._producer(lambda: end)))
+        self.length = sum(length for length, _ in self.segments)
+
+    @staticmethod
+    def _producer(build):
+        def produce(lo, hi):
+            yield build()[lo:hi]
+        return produce
+
+    def _directory_record_length(self, entry, offset):
+        zip64_fields = (2 if entry.size >= ZIP64_LIMIT else 0) + (1 if offset >= ZIP64_LIMIT else 0)
+        return 46 + len(entry.name.encode()) + (4 + 8 * zip64_fields if zip64_fields else 0)
+
+    def local_header(self, entry):
+        name = entry.name.encode()
+        zip64 = entry.size >= ZIP64_LIMIT
+        size = ZIP64_LIMIT if zip64 else entry.size
+        extra = struct.pack('<HHQQ', 0x0001, 16, entry.size, entry.size) if zip64 else b''
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, ZIP_UTF8_FLAG, 0,
+            entry.dos_time, entry.dos_date, zip_crc(self.storage, entry), size, size, len(name), len(extra)
+        ) + name + extra
+
+    def central_directory(self):
+        records = []
+        for entry, offset in zip(self.entries, self._offsets):
+            name = entry.name.encode()
+            fields = []
+            if entry.size >= ZIP64_LIMIT:
+                fields += [entry.size, entry.size]
+            if offset >= ZIP64_LIMIT:
+                fields.append(offset)
+            extra = struct.pack(f'<HH{len(fields)}Q', 0x0001, 8 * len(fields), *fields) if fields else b''
+            size = ZIP64_LIMIT if entry.size >= ZIP64_LIMIT else entry.size
+            records.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, 45, 45 if fields else 20, ZIP_UTF8_FLAG, 0,
+                entry.dos_time, entry.dos_date, zip_crc(self.storage, entry), size, size,
+                len(name), len(extra), 0, 0, 0, 0, min(offset, ZIP64_LIMIT)
+            ) + name + extra)
+        return b''.join(records)
+
+    def end_records(self):
+        count = len(self.entries)
+        records = b''
+        if count >= 0xFFFF or self.directory_offset >= ZIP64_LIMIT or self.directory_length >= ZIP64_LIMIT:
+            zip64_end_offset = self.directory_offset + self.directory_length
+            records += struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+                count, count, self.directory_length, self.directory_offset
+            )
+            records += struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+        return records + struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(self.directory_length, ZIP64_LIMIT), min(self.directory_offset, ZIP64_LIMIT), 0
+        )
+
+    def etag(self):
+        digest = hashlib.sha256()
+        for entry in self.entries:
+            digest.update(f"{entry.name}|{entry.url}|{entry.size}|{entry.dos_date}|{entry.dos_time}\n".encode())
+        return digest.hexdigest()
+
+    def iter_range(self, start=0, stop=None):
+        stop = self.length if stop is None else stop
+        position = 0
+        for length, produce in self.segments:
+            segment_start, position = position, position + length
+            if position <= start or length == 0:
+                continue
+            if segment_start >= stop:
+                break
+            yield from produce(max(start, segment_start) - segment_start, min(stop, position) - segment_start)
+
+def export_entries(storage, items):
+    # Tamaño y CRC desde stored_files (sin tocar el almacenamiento); los archivos antiguos se miden
+    hashes = {m.group(1): i.src for i in items if (m := CONTENT_ADDRESS_RE.search(i.src or ''))}
+    known = {}
+    if hashes:
+        rows = db.session.query(StoredFile.url, StoredFile.size, StoredFile.crc32) \
+            .filter(StoredFile.sha256.in_(list(hashes)))
+        known = {r.url: (r.size, r.crc32) for r in rows}
+    entries = []
+    for item in items:
+        size, crc = known.get(item.src, (None, None))
+        if size is None:
+            size = storage.size(item.src)
+        if size is None:
+            logger.warning("Exportación: falta el archivo de %s", item.src)
+            continue
+        extension = item.src.rsplit('.', 1)[-1].lower()
+        name = secure_filename(item.alt or '') or 'archivo'
+        if not name.lower().endswith('.' + extension):
+            name = f"{name}.{extension}"
+        entries.append(ZipEntry(f"{item.id}_{name}", item.src, size, *dos_datetime(item.created_at), crc))
+    return entries
+
 # ==================== RUTAS DE API ====================
 
-@app.route('/api/events', methods=['GET'])
+@bp.route('/api/events', methods=['GET'])
+@read_replica
+@cached_response('events')
 def get_events():
     try:
-        events = Event.query.order_by(Event.created_at.desc()).all()
-        return jsonify({'status': 'success', 'events': [e.to_dict() for e in events]})
+        try:
+            since = sync_since()
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid since parameter'}), 400
+        # La versión se lee antes que las filas: en el peor caso la siguiente sincronización repite alguna
+        version = request_sync_version()
+        if since is None or sync_reset_needed(since):
+            # Con `reset` el cliente reemplaza su lista por la completa
+            events = Event.query.order_by(Event.created_at.desc()).all()
+            body = {'status': 'success', 'events': [e.to_dict() for e in events], 'version': version}
+            if since is not None:
+                body.update(reset=True, deleted=[])
+            return jsonify(body)
+        events = Event.query.filter(Event.version > since).order_by(Event.version, Event.id).all()
+        return jsonify({
+            'status': 'success',
+            'reset': False,
+            'events': [e.to_dict() for e in events],
+            'deleted': deleted_since('events', since),
+            'version': version
+        })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/events', methods=['POST'])
+@bp.route('/api/events/search', methods=['GET'])
+@read_replica
+@cached_response('events')
+def search_events():
+    try:
+        try:
+            terms, limit, offset = search_params()
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid search parameters'}), 400
+        events, has_more = find_events(terms, limit, offset)
+        return jsonify({
+            'status': 'success',
+            'events': [e.to_dict() for e in events],
+            'next_offset': offset + limit if has_more else None,
+            'has_more': has_more
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/events', methods=['POST'])
 def create_event():
     try:
-        title = request.form.get('title')
-        date = request.form.get('date')
-        description = request.form.get('description')
-        category = request.form.get('category', 'evento')
-        featured = request.form.get('featured') == 'true'
-        
-        image_url = None
+        image = None
         if 'file' in request.files:
             file = request.files['file']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'events')
-                if not os.path.exists(save_path): os.makedirs(save_path)
-                file.save(os.path.join(save_path, filename))
-                image_url = f"/uploads/events/{filename}"
+                image = store_upload(file)
+                schedule_variants(get_storage().local_path(image.url))
         
-        new_event = Event(
-            title=title,
-            date=date,
-            description=description,
-            category=category,
-            featured=featured,
-            image=image_url
-        )
-        db.session.add(new_event)
-        db.session.commit()
-        return jsonify({'status': 'success', 'event': new_event.to_dict()}), 201
+        return create_event_record(request.form, image)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/events/<int:event_id>', methods=['PUT'])
+@bp.route('/api/events/<int:event_id>', methods=['PUT'])
 def update_event(event_id):
     try:
         event = Event.query.get(event_id)
@@ -213,76 +2466,209 @@ def update_event(event_id):
         event.category = request.form.get('category', event.category)
         event.featured = request.form.get('featured') == 'true'
         
+        released = None
         if 'file' in request.files:
             file = request.files['file']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'events')
-                if not os.path.exists(save_path): os.makedirs(save_path)
-                file.save(os.path.join(save_path, filename))
-                event.image = f"/uploads/events/{filename}"
+                image = store_upload(file)
+                schedule_variants(get_storage().local_path(image.url))
+                released = release_reference(event.image)
+                event.image = image.url
+                add_references([image])
                 
         db.session.commit()
+        response_cache.invalidate('events', 'gallery', 'stats')
+        reclaim_files([released])
         return jsonify({'status': 'success', 'event': event.to_dict()})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/events/<int:event_id>', methods=['DELETE'])
+@bp.route('/api/events/<int:event_id>', methods=['DELETE'])
 def delete_event(event_id):
     try:
         event = Event.query.get(event_id)
         if not event:
             return jsonify({'status': 'error', 'message': 'Event not found'}), 404
+        released = delete_event_gallery(event_id)
+        released.append(release_reference(event.image))
         db.session.delete(event)
         db.session.commit()
+        response_cache.invalidate('events', 'gallery', 'stats')
+        # Los archivos se liberan en segundo plano: la respuesta no espera a miles de borrados
+        run_in_background(reclaim_files, released)
         return jsonify({'status': 'success', 'message': 'Event deleted'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/gallery', methods=['GET'])
+GALLERY_DEFAULT_LIMIT = 60
+GALLERY_MAX_LIMIT = 200
+
+def encode_cursor(created_at, item_id):
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, item_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+    return datetime.fromisoformat(created_at), int(item_id)
+
+def gallery_page(limit, event_id=None, year=None, item_type=None, after=None):
+    query = gallery_rows()
+    if event_id is not None:
+        query = query.filter(GalleryItem.event_id == event_id)
+    if year is not None:
+        query = query.filter(GalleryItem.year == year)
+    if item_type:
+        query = query.filter(GalleryItem.type == item_type)
+    if after:
+        # Keyset: solo filas estrictamente anteriores al último (created_at, id) entregado
+        created_at, item_id = after
+        query = query.filter(db.or_(
+            GalleryItem.created_at < created_at,
+            db.and_(GalleryItem.created_at == created_at, GalleryItem.id < item_id)
+        ))
+
+    # Se pide una fila extra para saber si hay una página siguiente
+    items = query.order_by(GalleryItem.created_at.desc(), GalleryItem.id.desc()).limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        'items': [gallery_row_to_dict(i) for i in items],
+        'next_cursor': encode_cursor(items[-1].created_at, items[-1].id) if has_more else None,
+        'has_more': has_more
+    }
+
+def gallery_delta(since, event_id=None, year=None, item_type=None):
+    if sync_reset_needed(since):
+        # Anterior a la retención de lápidas: no se puede saber qué se borró
+        return {'reset': True, 'items': [], 'deleted': []}
+    query = gallery_rows().filter(GalleryItem.version > since)
+    if event_id is not None:
+        query = query.filter(GalleryItem.event_id == event_id)
+    if year is not None:
+        query = query.filter(GalleryItem.year == year)
+    if item_type:
+        query = query.filter(GalleryItem.type == item_type)
+    items = query.order_by(GalleryItem.version, GalleryItem.id).limit(SYNC_MAX_CHANGES + 1).all()
+    if len(items) > SYNC_MAX_CHANGES:
+        # Demasiados cambios: el cliente debe volver a cargar la galería paginada
+        return {'reset': True, 'items': [], 'deleted': []}
+    # Las lápidas no se filtran (la fila ya no existe): los ids desconocidos se ignoran
+    return {'reset': False, 'items': [gallery_row_to_dict(i) for i in items], 'deleted': deleted_since('gallery_items', since)}
+
+@bp.route('/api/gallery', methods=['GET'])
+@read_replica
+@cached_response('gallery')
 def get_gallery():
     try:
-        items = GalleryItem.query.order_by(GalleryItem.created_at.desc()).all()
-        return jsonify({'status': 'success', 'items': [i.to_dict() for i in items]})
+        try:
+            limit = int(request.args.get('limit', GALLERY_DEFAULT_LIMIT))
+            event_id = request.args.get('event_id', type=int)
+            year = request.args.get('year', type=int)
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+            since = sync_since()
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid pagination parameters'}), 400
+        version = request_sync_version()
+        if since is not None:
+            return jsonify({'status': 'success', **gallery_delta(since, event_id, year, request.args.get('type')), 'version': version})
+        limit = max(1, min(limit, GALLERY_MAX_LIMIT))
+        page = gallery_page(limit, event_id, year, request.args.get('type'), after)
+        return jsonify({'status': 'success', **page, 'version': version})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/gallery/search', methods=['GET'])
+@read_replica
+@cached_response('gallery')
+def search_gallery():
+    try:
+        try:
+            terms, limit, offset = search_params()
+            event_id = request.args.get('event_id', type=int)
+            year = request.args.get('year', type=int)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid search parameters'}), 400
+        items, has_more = find_gallery_items(terms, limit, offset, event_id, year)
+        return jsonify({
+            'status': 'success',
+            'items': [gallery_row_to_dict(i) for i in items],
+            'next_offset': offset + limit if has_more else None,
+            'has_more': has_more
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/gallery/export', methods=['GET'])
+@read_replica
+def export_gallery():
+    try:
+        try:
+            event_id = request.args.get('event_id', type=int)
+            year = request.args.get('year', type=int)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid export parameters'}), 400
+        if event_id is None and year is None:
+            return jsonify({'status': 'error', 'message': 'event_id or year is required'}), 400
+
+        query = db.session.query(GalleryItem.id, GalleryItem.src, GalleryItem.alt, GalleryItem.created_at)
+        if event_id is not None:
+            query = query.filter(GalleryItem.event_id == event_id)
+        if year is not None:
+            query = query.filter(GalleryItem.year == year)
+        storage = get_storage()
+        entries = export_entries(storage, query.order_by(GalleryItem.created_at, GalleryItem.id).all())
+        if not entries:
+            return jsonify({'status': 'error', 'message': 'No gallery items to export'}), 404
+        archive = ZipStream(storage, entries)
+        etag = archive.etag()
+
+        start, stop, status = 0, archive.length, 200
+        byte_range = request.range
+        # If-Range: si el contenido cambió desde la descarga interrumpida, se envía entero
+        if byte_range and len(byte_range.ranges) == 1 and (
+                'If-Range' not in request.headers or request.if_range.etag == etag):
+            bounds = byte_range.range_for_length(archive.length)
+            if bounds is None:
+                response = current_app.response_class(status=416)
+                response.headers['Content-Range'] = f"bytes */{archive.length}"
+                return response
+            (start, stop), status = bounds, 206
+
+        filename = 'galeria'
+        if event_id is not None:
+            filename += f"-evento-{event_id}"
+        if year is not None:
+            filename += f"-{year}"
+        response = current_app.response_class(archive.iter_range(start, stop), status=status, mimetype='application/zip')
+        response.headers['Content-Length'] = str(stop - start)
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Content-Disposition'] = f"attachment; filename={filename}.zip"
+        if status == 206:
+            response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{archive.length}"
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/gallery', methods=['POST'])
+@bp.route('/api/gallery', methods=['POST'])
 def create_gallery_item():
     try:
         if 'file' not in request.files:
             return jsonify({'status': 'error', 'message': 'No file sent'}), 400
         
         file = request.files['file']
-        event_id = request.form.get('event_id')
-        year = request.form.get('year')
-        item_type = request.form.get('type', 'image')
-        
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'gallery')
-            if not os.path.exists(save_path): os.makedirs(save_path)
-            file.save(os.path.join(save_path, filename))
-            
-            new_item = GalleryItem(
-                src=f"/uploads/gallery/{filename}",
-                alt=filename,
-                event_id=event_id,
-                year=year,
-                type=item_type
-            )
-            db.session.add(new_item)
-            db.session.commit()
-            return jsonify({'status': 'success', 'item': new_item.to_dict()}), 201
+            upload = store_upload(file)
+            schedule_variants(get_storage().local_path(upload.url))
+            return create_gallery_record(upload, request.form)
         return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/gallery/bulk', methods=['POST'])
+@bp.route('/api/gallery/bulk', methods=['POST'])
 def create_gallery_bulk():
     try:
         files = request.files.getlist('files[]')
@@ -290,122 +2676,155 @@ def create_gallery_bulk():
         year = request.form.get('year')
         item_type = request.form.get('type', 'image')
         
-        success_count = 0
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Invalid year'}), 400
+
         failed = []
-        
+        pending = []
         for file in files:
             if file and allowed_file(file.filename):
+                pending.append(file)
+            else:
+                failed.append({'filename': file.filename, 'error': 'Invalid file type'})
+
+        # Escritura concurrente (con hash) en un pool acotado; la dirección de contenido
+        # hace imposible que dos archivos distintos se pisen
+        storage = get_storage()
+        saved = []
+        with ThreadPoolExecutor(max_workers=current_app.config['BULK_SAVE_WORKERS']) as executor:
+            futures = [(file, executor.submit(store_upload, file, storage)) for file in pending]
+            for file, future in futures:
                 try:
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f"{timestamp}_{filename}"
-                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'gallery')
-                    if not os.path.exists(save_path): os.makedirs(save_path)
-                    file.save(os.path.join(save_path, filename))
-                    
-                    new_item = GalleryItem(
-                        src=f"/uploads/gallery/{filename}",
-                        alt=filename,
-                        event_id=event_id,
-                        year=int(year),
-                        type=item_type
-                    )
-                    db.session.add(new_item)
-                    success_count += 1
+                    saved.append(future.result())
                 except Exception as e:
                     failed.append({'filename': file.filename, 'error': str(e)})
-            else:
-                failed.append({'filename': file.filename, 'error': 'Invalid file type'})
-        
-        db.session.commit()
+
+        if saved:
+            now = datetime.utcnow()
+            rows = [{
+                'src': upload.url,
+                'alt': upload.filename,
+                'event_id': event_id,
+                'year': year,
+                'type': item_type,
+                'created_at': now
+            } for upload in saved]
+            try:
+                # Un solo INSERT con executemany y los contadores, en una única transacción.
+                # Si falla, los archivos quedan sin referencias y los recoge el GC.
+                version = next_sync_version(db.session)
+                db.session.execute(db.insert(GalleryItem), [{**row, 'version': version} for row in rows])
+                add_references(saved)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            response_cache.invalidate('gallery', 'stats')
+            for upload in saved:
+                schedule_variants(storage.local_path(upload.url))
+
         return jsonify({
             'status': 'success',
-            'success_count': success_count,
+            'success_count': len(saved),
             'failed_count': len(failed),
             'failed': failed
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/gallery/<int:item_id>', methods=['DELETE'])
+@bp.route('/api/gallery/<int:item_id>', methods=['DELETE'])
 def delete_gallery_item(item_id):
     try:
         item = GalleryItem.query.get(item_id)
         if not item:
             return jsonify({'status': 'error', 'message': 'Item not found'}), 404
+        released = release_reference(item.src)
         db.session.delete(item)
         db.session.commit()
+        response_cache.invalidate('gallery', 'stats')
+        reclaim_files([released])
         return jsonify({'status': 'success', 'message': 'Item deleted'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/sponsors', methods=['GET'])
+@bp.route('/api/sponsors', methods=['GET'])
+@read_replica
+@cached_response('sponsors')
 def get_sponsors():
     try:
-        sponsors = Sponsor.query.order_by(Sponsor.tier.asc()).all()
-        return jsonify({'status': 'success', 'sponsors': [s.to_dict() for s in sponsors]})
+        try:
+            since = sync_since()
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid since parameter'}), 400
+        version = request_sync_version()
+        if since is None or sync_reset_needed(since):
+            sponsors = Sponsor.query.order_by(Sponsor.tier.asc()).all()
+            body = {'status': 'success', 'sponsors': [s.to_dict() for s in sponsors], 'version': version}
+            if since is not None:
+                body.update(reset=True, deleted=[])
+            return jsonify(body)
+        sponsors = Sponsor.query.filter(Sponsor.version > since).order_by(Sponsor.version, Sponsor.id).all()
+        return jsonify({
+            'status': 'success',
+            'reset': False,
+            'sponsors': [s.to_dict() for s in sponsors],
+            'deleted': deleted_since('sponsors', since),
+            'version': version
+        })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/sponsors', methods=['POST'])
+@bp.route('/api/sponsors', methods=['POST'])
 def create_sponsor():
     try:
         if 'file' not in request.files:
             return jsonify({'status': 'error', 'message': 'No logo sent'}), 400
         
         file = request.files['file']
-        name = request.form.get('name')
-        tier = request.form.get('tier')
-        
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'sponsors')
-            if not os.path.exists(save_path): os.makedirs(save_path)
-            
-            file.save(os.path.join(save_path, filename))
-            
-            new_sponsor = Sponsor(
-                name=name,
-                logo=f"/uploads/sponsors/{filename}",
-                tier=tier
-            )
-            db.session.add(new_sponsor)
-            db.session.commit()
-            
-            return jsonify({'status': 'success', 'sponsor': new_sponsor.to_dict()}), 201
+            logo = store_upload(file)
+            schedule_variants(get_storage().local_path(logo.url))
+            return create_sponsor_record(logo, request.form)
         return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/sponsors/<int:sponsor_id>', methods=['DELETE'])
+@bp.route('/api/sponsors/<int:sponsor_id>', methods=['DELETE'])
 def delete_sponsor(sponsor_id):
     try:
         sponsor = Sponsor.query.get(sponsor_id)
         if not sponsor:
             return jsonify({'status': 'error', 'message': 'Sponsor not found'}), 404
         
+        released = release_reference(sponsor.logo)
         db.session.delete(sponsor)
         db.session.commit()
+        response_cache.invalidate('sponsors', 'stats')
+        reclaim_files([released])
         return jsonify({'status': 'success', 'message': 'Sponsor deleted'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/hero-settings', methods=['GET'])
+@bp.route('/api/hero-settings', methods=['GET'])
+@read_replica
+@cached_response('hero')
 def get_hero_settings():
     try:
-        settings = HeroSettings.query.first()
-        if not settings:
-            settings = HeroSettings(hero_video='', event_date='2025-08-10T06:00:00')
-            db.session.add(settings)
-            db.session.commit()
-        return jsonify({'status': 'success', 'settings': settings.to_dict()})
+        try:
+            since = sync_since()
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid since parameter'}), 400
+        version = request_sync_version()
+        settings = hero_settings_dict(HeroSettings.query.first())
+        # Con ?since= y sin cambios, settings es null
+        changed = since is None or settings['version'] > since
+        return jsonify({'status': 'success', 'settings': settings if changed else None, 'version': version})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/hero-settings/video', methods=['PUT'])
+@bp.route('/api/hero-settings/video', methods=['PUT'])
 def update_hero_video():
     try:
         if 'file' not in request.files:
@@ -413,62 +2832,167 @@ def update_hero_video():
         
         file = request.files['file']
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"hero_{timestamp}_{filename}"
-            
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'hero')
-            if not os.path.exists(save_path): os.makedirs(save_path)
-            
-            file.save(os.path.join(save_path, filename))
-            
-            settings = HeroSettings.query.first()
-            settings.hero_video = f"/uploads/hero/{filename}"
-            db.session.commit()
-            
-            return jsonify({'status': 'success', 'url': settings.hero_video})
+            return set_hero_video(store_upload(file))
         return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/hero-settings/event-date', methods=['PUT'])
+@bp.route('/api/hero-settings/event-date', methods=['PUT'])
 def update_event_date():
     try:
         data = request.get_json()
         event_date = data.get('eventDate')
         
-        settings = HeroSettings.query.first()
+        settings = editable_hero_settings()
         settings.event_date = event_date
         db.session.commit()
+        response_cache.invalidate('hero')
         
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/event-info', methods=['GET'])
+@bp.route('/api/event-info', methods=['GET'])
+@read_replica
+@cached_response('hero')
 def get_event_info():
     try:
         settings = HeroSettings.query.first()
         if not settings:
-            return jsonify({'status': 'success', 'eventDate': '2025-08-10T06:00:00'})
+            return jsonify({'status': 'success', 'eventDate': DEFAULT_EVENT_DATE})
         return jsonify({'status': 'success', 'eventDate': settings.event_date})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/stats', methods=['GET'])
+def stats_query():
+    # Todos los conteos y desgloses en un único UNION ALL: un solo viaje a la base de datos
+    def count(metric, model, key=None, *criteria):
+        key_column = db.cast(key, db.String(255)) if key is not None else db.cast(db.null(), db.String(255))
+        query = db.select(db.literal(metric).label('metric'), key_column.label('key'), db.func.count().label('total'))
+        query = query.select_from(model).where(*criteria)
+        return query.group_by(key) if key is not None else query
+
+    return db.union_all(
+        count('total_events', Event),
+        count('featured_events', Event, None, Event.featured.is_(True)),
+        count('total_gallery', GalleryItem),
+        count('gallery_by_event', GalleryItem, GalleryItem.event_id),
+        count('gallery_by_year', GalleryItem, GalleryItem.year),
+        count('gallery_by_type', GalleryItem, GalleryItem.type),
+        count('total_sponsors', Sponsor),
+        count('sponsors_by_tier', Sponsor, Sponsor.tier),
+    )
+
+@bp.route('/api/stats', methods=['GET'])
+@read_replica
+@cached_response('stats')
 def get_stats():
     try:
-        # Aquí podrías calcular estadísticas reales
         stats = {
-            'total_events': Event.query.count(),
-            'total_gallery': GalleryItem.query.count(),
-            'total_sponsors': Sponsor.query.count()
+            'total_events': 0,
+            'featured_events': 0,
+            'total_gallery': 0,
+            'total_sponsors': 0,
+            'gallery_by_event': {},
+            'gallery_by_year': {},
+            'gallery_by_type': {},
+            'sponsors_by_tier': {}
         }
+        for metric, key, total in db.session.execute(stats_query()):
+            if isinstance(stats[metric], dict):
+                stats[metric][key or ''] = total
+            else:
+                stats[metric] = total
         return jsonify({'status': 'success', 'stats': stats})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/login', methods=['POST'])
+BOOTSTRAP_RECENT_EVENTS = 6
+BOOTSTRAP_FEATURED_EVENTS = 10
+BOOTSTRAP_GALLERY_LIMIT = 24
+
+@bp.route('/api/bootstrap', methods=['GET'])
+@read_replica
+@cached_response('bootstrap')
+def get_bootstrap():
+    # Todo lo que necesita la portada en una sola respuesta cacheable (5 consultas, solo lectura)
+    try:
+        version = request_sync_version()
+        hero = hero_settings_dict(HeroSettings.query.first())
+
+        # Destacados y recientes en una sola consulta (UNION ALL de dos subconsultas con LIMIT)
+        featured = db.select(Event).where(Event.featured.is_(True)) \
+            .order_by(Event.created_at.desc()).limit(BOOTSTRAP_FEATURED_EVENTS).subquery()
+        recent = db.select(Event).order_by(Event.created_at.desc()).limit(BOOTSTRAP_RECENT_EVENTS).subquery()
+        events = db.session.execute(
+            db.select(Event).from_statement(db.union_all(db.select(featured), db.select(recent)))
+        ).scalars().all()
+        events = sorted({e.id: e for e in events}.values(), key=lambda e: (e.created_at or datetime.min, e.id), reverse=True)
+        featured_events = [e for e in events if e.featured][:BOOTSTRAP_FEATURED_EVENTS]
+        recent_events = events[:BOOTSTRAP_RECENT_EVENTS]
+
+        sponsors = {}
+        for sponsor in Sponsor.query.order_by(Sponsor.tier.asc(), Sponsor.id.asc()).all():
+            sponsors.setdefault(sponsor.tier, []).append(sponsor.to_dict())
+
+        return jsonify({
+            'status': 'success',
+            'settings': hero,
+            'eventDate': hero['eventDate'],
+            'events': {
+                'featured': [e.to_dict() for e in featured_events],
+                'recent': [e.to_dict() for e in recent_events]
+            },
+            'sponsors': sponsors,
+            'gallery': gallery_page(BOOTSTRAP_GALLERY_LIMIT),
+            'version': version
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    # Server-Sent Events: emite la versión actual al conectar y cada nueva versión después;
+    # el cliente pide ?since=<versión anterior> a los listados que le interesen
+    app = current_app._get_current_object()
+    try:
+        version = current_sync_version()
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    def version_event(version):
+        return f"id: {version}\nevent: version\ndata: {json.dumps({'version': version})}\n\n"
+
+    if not change_broadcaster.subscribe(app):
+        # Sin hueco: un 503 cerraría el EventSource para siempre (la especificación no reintenta
+        # respuestas que no sean 200). Se envía la versión actual y se cierra con un retry largo:
+        # el navegador vuelve solo y el cliente se mantiene al día sondeando
+        retry = SYNC_BUSY_RETRY_MS + random.randint(0, SYNC_BUSY_RETRY_MS)
+        response = current_app.response_class(f"retry: {retry}\n" + version_event(version), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    change_broadcaster.publish(version)
+    timeout = app.config['SYNC_STREAM_TIMEOUT']
+
+    def generate(version):
+        yield f"retry: {SYNC_RETRY_MS}\n" + version_event(version)
+        # Duración limitada para liberar el hilo; EventSource se reconecta solo
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            latest = change_broadcaster.wait(version, min(SYNC_KEEPALIVE, max(deadline - time.monotonic(), 0)))
+            if latest is not None and latest > version:
+                version = latest
+                yield version_event(version)
+            else:
+                yield ": keepalive\n\n"
+
+    response = current_app.response_class(generate(version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(change_broadcaster.unsubscribe)
+    return response
+
+@bp.route('/api/admin/login', methods=['POST'])
 def admin_login():
     data = request.get_json()
     if data.get('password') == 'mmq2025admin':
@@ -478,29 +3002,273 @@ def admin_login():
 # ==================== INICIALIZACIÓN ====================
 
 def init_db():
-    with app.app_context():
-        db.create_all()
-        if not HeroSettings.query.first():
-            db.session.add(HeroSettings(hero_video='', event_date='2025-08-10T06:00:00'))
-        if not EventSetting.query.first():
-            db.session.add(EventSetting(
-                event_name='Media Maratón de Quibdó 2025',
-                event_date=datetime(2025, 8, 10, 6, 0, 0)
-            ))
+    # Idempotente: crea tablas e índices que falten y los registros iniciales (requiere app context)
+    db.create_all()
+    # create_all no añade columnas ni índices a tablas existentes
+    inspector = sa_inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    if not SyncState.query.first():
+        # Antes que el resto: los demás registros iniciales ya toman una versión
+        db.session.add(SyncState(id=1, version=0))
         db.session.commit()
-        print("✅ Base de Datos MySQL inicializada")
+    if not HeroSettings.query.first():
+        db.session.add(HeroSettings(hero_video='', event_date=DEFAULT_EVENT_DATE))
+    if not EventSetting.query.first():
+        db.session.add(EventSetting(
+            event_name='Media Maratón de Quibdó 2025',
+            event_date=datetime(2025, 8, 10, 6, 0, 0)
+        ))
+    db.session.commit()
+    print("✅ Base de Datos MySQL inicializada")
+
+@bp.cli.command('init-db')
+def init_db_command():
+    init_db()
+
+# ==================== INSTANTÁNEAS JSON ====================
+
+# Alternativa totalmente estática: tras cada cambio se escriben en dist/snapshots/ las mismas
+# respuestas que darían los endpoints públicos, listas para un CDN o un hosting estático.
+SNAPSHOT_FOLDER = 'snapshots'
+SNAPSHOT_ENDPOINTS = {
+    'bootstrap.json': 'main.get_bootstrap',
+    'events.json': 'main.get_events',
+    'gallery.json': 'main.get_gallery',
+    'sponsors.json': 'main.get_sponsors',
+    'hero-settings.json': 'main.get_hero_settings',
+    'event-info.json': 'main.get_event_info',
+}
+
+def write_snapshot(path, body):
+    # Escritura atómica: quien lea el archivo nunca ve una versión a medias
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+
+def publish_snapshots(force=False):
+    app = current_app._get_current_object()
+    folder = os.path.join(app.static_folder, SNAPSHOT_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(folder, 'version.json')
+    with open(os.path.join(folder, '.lock'), 'w') as lock:
+        # Un worker a la vez, y nunca una versión anterior encima de una más nueva
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        version = current_sync_version()
+        try:
+            with open(manifest_path) as f:
+                published = json.load(f)['version']
+        except (OSError, ValueError, KeyError):
+            published = None
+        if not force and published is not None and version <= published:
+            return False
+        for filename, endpoint in SNAPSHOT_ENDPOINTS.items():
+            # Sin caché ni réplica: la vista original contra el primario
+            view = inspect.unwrap(app.view_functions[endpoint])
+            with app.test_request_context():
+                response = app.make_response(view())
+            if response.status_code != 200:
+                raise RuntimeError(f"{endpoint} respondió {response.status_code}")
+            write_snapshot(os.path.join(folder, filename), response.get_data())
+        write_snapshot(manifest_path, json.dumps({
+            'version': version, 'published_at': datetime.utcnow().isoformat()
+        }).encode())
+        return True
+
+class SnapshotPublisher:
+    """Publica en segundo plano agrupando ráfagas: una publicación en curso y como mucho otra pendiente."""
+
+    def __init__(self):
+        self._pending = False
+        self._running = False
+        self._lock = threading.Lock()
+
+    def schedule(self, app):
+        if not app.config['SNAPSHOT_PUBLISH']:
+            return
+        with self._lock:
+            self._pending = True
+            if self._running:
+                return
+            self._running = True
+        maintenance_executor().submit(self._run, app)
+
+    def _run(self, app):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+            try:
+                with app.app_context():
+                    publish_snapshots()
+            except Exception as e:
+                logger.warning("No se pudieron publicar las instantáneas: %s", e)
+
+snapshot_publisher = app_state('snapshot_publisher')
+
+@bp.cli.command('publish-snapshots')
+def publish_snapshots_command():
+    publish_snapshots(force=True)
+    print(f"✅ Instantáneas publicadas en {os.path.join(current_app.static_folder, SNAPSHOT_FOLDER)}")
+
+# ==================== FRONTEND ESTÁTICO ====================
+
+# Vite genera assets/<nombre>-<hash de 8>.<ext>: su contenido nunca cambia para la misma URL
+HASHED_ASSET_PATTERN = r'^/assets/.+-[A-Za-z0-9_-]{8}\.\w+$'
+INDEX_MAX_AGE = 60
+
+class SpaIndex:
+    """index.html en memoria (cuerpo, gzip y ETag); se relee solo si cambió en disco."""
+
+    def __init__(self, path):
+        self.path = path
+        self._index = {'mtime': None, 'body': None, 'gzip': None, 'etag': None}
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        with self._lock:
+            if self._index['mtime'] != mtime:
+                with open(self.path, 'rb') as f:
+                    body = f.read()
+                self._index.update(
+                    mtime=mtime,
+                    body=body,
+                    gzip=gzip.compress(body, 9),
+                    etag=hashlib.sha256(body).hexdigest()
+                )
+            return dict(self._index)
+
+spa_index = app_state('spa_index')
+
+def serve_spa_index():
+    index = spa_index.load()
+    if index is None:
+        return "Frontend not found", 404
+    use_gzip = 'gzip' in request.accept_encodings
+    response = current_app.response_class(index['gzip'] if use_gzip else index['body'], mimetype='text/html')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{index['etag']}-gz" if use_gzip else index['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = INDEX_MAX_AGE
+    return response.make_conditional(request)
 
 # ==================== MANEJO DE ERRORES & RUN ====================
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     if request.path.startswith('/api/'):
         return jsonify({'status': 'error', 'message': 'API route not found'}), 404
-    if os.path.exists(os.path.join(app.static_folder, 'index.html')):
-        return send_from_directory(app.static_folder, 'index.html')
-    return "Frontend not found", 404
+    return serve_spa_index()
+
+# ==================== APLICACIÓN ====================
+
+def init_app_state(app):
+    # Estado en memoria por app (ver app_state): cada create_app parte de cero
+    config = app.config
+    threads = ThreadBudget(max(config['WORKER_THREADS'] - config['RESERVED_READ_THREADS'], 0),
+                           config['SYNC_STREAM_RESERVE'])
+    app.extensions.update({
+        'long_request_threads': threads,
+        'admission_gates': create_admission_gates(config, threads),
+        'response_cache': ResponseCache(config['CACHE_MAX_ENTRIES'], config['CACHE_TTL'], CACHE_DEPENDENTS),
+        'change_broadcaster': ChangeBroadcaster(threads, config['SYNC_MAX_STREAMS'], config['SYNC_POLL_INTERVAL']),
+        'replica_down_until': {},
+        'event_search_index': SearchIndex(load_event_documents, {'title': 3, 'category': 2, 'description': 1}),
+        'gallery_search_index': SearchIndex(load_gallery_documents, {'alt': 1}),
+        'snapshot_publisher': SnapshotPublisher(),
+        'spa_index': SpaIndex(os.path.join(app.static_folder, 'index.html')),
+        'shared_version': SharedVersion(config['SYNC_VERSION_FILE']) if config['SYNC_VERSION_FILE'] else None,
+    })
+
+# Con gunicorn --preload los workers heredan los engines del master: cada hijo descarta los
+# pools heredados (sin cerrar los sockets del padre) y abre sus propias conexiones. Un solo
+# hook para todas las apps del proceso; las que se descartan salen solas del conjunto.
+_inherited_engines = weakref.WeakSet()
+
+def _dispose_inherited_engines():
+    for engine in list(_inherited_engines):
+        engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_inherited_engines)
+
+def create_app(config=None):
+    # Cargar variables de entorno
+    load_dotenv()
+
+    app = Flask(__name__, static_folder='dist', static_url_path='')
+    app.config.update(default_config())
+    if isinstance(config, Mapping):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    # Flask-SQLAlchemy no aplica SQLALCHEMY_ENGINE_OPTIONS a los binds: cada réplica lleva las suyas
+    app.config.setdefault('SQLALCHEMY_BINDS', {
+        f"{REPLICA_BIND_PREFIX}{i}": {'url': url, **engine_options(app.config, url)}
+        for i, url in enumerate(app.config['DATABASE_REPLICA_URLS'])
+    })
+
+    app.json = TimedJSONProvider(app)
+    CORS(app)
+    db.init_app(app)
+    if app.config['SYNC_VERSION_FILE'] is None:
+        uri_hash = hashlib.sha256(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:16]
+        app.config['SYNC_VERSION_FILE'] = os.path.join(tempfile.gettempdir(), f'quibd-sync-{uri_hash}.version')
+    init_app_state(app)
+    app.extensions['storage'] = create_storage(app.config)
+    app.register_blueprint(bp)
+
+    with app.app_context():
+        _inherited_engines.update(db.engines.values())
+
+    # WhiteNoise sirve dist/ antes de Flask: negocia Accept-Encoding con los .br/.gz
+    # precomprimidos en el build (python -m whitenoise.compress dist) y marca como
+    # inmutables los assets con hash. El resto de archivos recibe INDEX_MAX_AGE.
+    if WhiteNoise is not None and os.path.isdir(app.static_folder):
+        whitenoise = WhiteNoise(
+            app.wsgi_app,
+            root=app.static_folder,
+            prefix='/',
+            max_age=INDEX_MAX_AGE,
+            immutable_file_test=HASHED_ASSET_PATTERN
+        )
+        # Las instantáneas cambian en caliente y WhiteNoise fija tamaño y ETag al arrancar: las sirve Flask
+        for url in [url for url in whitenoise.files if url.startswith(f"/{SNAPSHOT_FOLDER}/")]:
+            del whitenoise.files[url]
+        app.wsgi_app = whitenoise
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `app:app` (gunicorn, flask --app) crea la app solo cuando se pide, no al importar el módulo
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    init_db()
+    app = create_app()
+    with app.app_context():
+        init_db()
+    IS_PROD = os.environ.get('RENDER') is not None
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=not IS_PROD, port=port, host='0.0.0.0')
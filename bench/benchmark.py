@@ -0,0 +1,440 @@
+"""Benchmark reproducible de la API Flask.
+
+Levanta app.py contra una base local (SQLite por defecto, o cualquier DATABASE_URL,
+p. ej. un contenedor MySQL), la siembra a la escala pedida y ejecuta cada endpoint
+público y de administración con clientes concurrentes. El resultado es un JSON con
+throughput, latencias p50/p95/p99, consultas por petición (de Server-Timing) y RSS
+pico del servidor por endpoint.
+
+Uso:
+    python bench/benchmark.py --events 100 --gallery 50000 --sponsors 200 \\
+        --concurrency 16 --requests 500 --output bench_results.json
+    python bench/benchmark.py --compare antes.json despues.json
+"""
+import argparse
+import http.client
+import importlib.util
+import itertools
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+# ==================== DATOS DE PRUEBA ====================
+
+def tiny_png(width=64, height=48):
+    # PNG válido generado con la librería estándar, para que el pipeline de derivados lo acepte
+    row = b'\x00' + bytes(random.randrange(256) for _ in range(width * 3))
+    raw = row * height
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+
+def multipart(fields=None, files=None):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, filename, content in files or []:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def seed(database_url, events, gallery, sponsors):
+    # Se importa la app con DATABASE_URL ya fijada para sembrar con sus propios modelos
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, REPO_ROOT)
+    import app as quibd
+
+    with quibd.create_app().app_context():
+        quibd.init_db()
+        db = quibd.db
+        now = datetime.utcnow()
+        db.session.execute(db.insert(quibd.Event), [{
+            'title': f'Evento {i}',
+            'date': f'2025-{i % 12 + 1:02d}-10',
+            'description': f'Descripción del evento {i} en Quibdó',
+            'category': random.choice(['evento', 'carrera', 'social']),
+            'featured': i % 10 == 0,
+            'created_at': now - timedelta(days=i)
+        } for i in range(events)])
+        event_ids = [row[0] for row in db.session.execute(db.select(quibd.Event.id))]
+        batch = 5000
+        for start in range(0, gallery, batch):
+            db.session.execute(db.insert(quibd.GalleryItem), [{
+                'src': f'/uploads/gallery/20250101_000000_seed_{i}.jpg',
+                'alt': f'seed_{i}.jpg',
+                'event_id': random.choice(event_ids),
+                'year': 2020 + i % 6,
+                'type': 'video' if i % 20 == 0 else 'image',
+                'created_at': now - timedelta(seconds=i)
+            } for i in range(start, min(start + batch, gallery))])
+        db.session.execute(db.insert(quibd.Sponsor), [{
+            'name': f'Patrocinador {i}',
+            'logo': f'/uploads/sponsors/20250101_000000_logo_{i}.png',
+            'tier': random.choice(['oro', 'plata', 'bronce'])
+        } for i in range(sponsors)])
+        db.session.commit()
+        return event_ids
+
+
+# ==================== SERVIDOR ====================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir, database_url, port):
+    env = dict(os.environ, DATABASE_URL=database_url, CACHE_TTL=str(args.cache_ttl), PYTHONPATH=REPO_ROOT)
+    use_gunicorn = args.server == 'gunicorn' and importlib.util.find_spec('gunicorn') is not None
+    if use_gunicorn:
+        cmd = [
+            sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(args.workers), '--threads', str(args.threads), 'app:app'
+        ]
+    else:
+        cmd = [sys.executable, '-c', (
+            'from werkzeug.serving import run_simple; from app import app; '
+            f'run_simple("127.0.0.1", {port}, app, threaded=True)'
+        )]
+    # cwd = workdir: UPLOAD_FOLDER cuelga del directorio actual y no ensucia el repo
+    process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            status, _, _ = request(port, 'GET', '/api/event-info')
+            if status == 200:
+                return process, 'gunicorn' if use_gunicorn else 'werkzeug'
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('El servidor no arrancó a tiempo')
+
+
+def process_tree(pid):
+    pids = [pid]
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return pids
+
+
+def reset_peak_rss(pid):
+    # Escribir "5" en clear_refs reinicia VmHWM (Linux >= 4.0)
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+
+
+def peak_rss_kb(pid):
+    total = 0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total or None
+
+
+# ==================== CLIENTE ====================
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, response.getheader('Server-Timing', ''), data
+    finally:
+        conn.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Nearest-rank
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run_scenario(port, server_pid, scenario, total, concurrency):
+    latencies, queries, errors, shed = [], [], 0, 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors, shed
+        start = time.perf_counter()
+        method, path, body, headers = scenario['build']()
+        status, timing, data = request(port, method, path, body, headers)
+        elapsed = time.perf_counter() - start
+        match = QUERIES_RE.search(timing)
+        with lock:
+            latencies.append(elapsed)
+            if match:
+                queries.append(int(match.group(1)))
+            # 429 es el control de admisión descartando carga, no un fallo
+            if status == 429:
+                shed += 1
+            elif status >= 400:
+                errors += 1
+        if 'after' in scenario:
+            scenario['after'](status, data)
+
+    reset_peak_rss(server_pid)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - start
+    return {
+        'requests': total,
+        'errors': errors,
+        'shed': shed,
+        'throughput_rps': round(total / wall, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_queries': round(sum(queries) / len(queries), 2) if queries else None,
+        'peak_rss_kb': peak_rss_kb(server_pid)
+    }
+
+
+# ==================== ESCENARIOS ====================
+
+def build_scenarios(args, event_ids, port):
+    image = tiny_png()
+    video = os.urandom(args.video_kb * 1024)
+    created = {'events': [], 'gallery': [], 'sponsors': []}
+    created_lock = threading.Lock()
+    gallery_delete_ids = itertools.count(1)
+    first_page = json.loads(request(port, 'GET', '/api/gallery?limit=60')[2])
+    cursor = first_page.get('next_cursor') or ''
+
+    def get(path):
+        return lambda: ('GET', path, None, {})
+
+    def form(method, path, fields, files_fn):
+        def build():
+            body, content_type = multipart(fields(), files_fn())
+            return method, path, body, {'Content-Type': content_type}
+        return build
+
+    def remember(kind, key):
+        def after(status, data):
+            if status < 400:
+                with created_lock:
+                    created[kind].append(json.loads(data)[key]['id'])
+        return after
+
+    def pop_created(kind, path):
+        def build():
+            with created_lock:
+                item_id = created[kind].pop() if created[kind] else 0
+            return 'DELETE', path.format(item_id), None, {}
+        return build
+
+    def chunked_upload():
+        # Protocolo completo (init + 2 partes + complete) contado como una sola operación
+        size = len(video)
+        status, _, data = request(port, 'POST', '/api/uploads', json.dumps({
+            'filename': 'bench.mp4', 'size': size, 'target': 'gallery'
+        }).encode(), {'Content-Type': 'application/json'})
+        upload_id = json.loads(data)['upload_id']
+        half = size // 2
+        request(port, 'PATCH', f'/api/uploads/{upload_id}', video[:half], {'Upload-Offset': '0'})
+        request(port, 'PATCH', f'/api/uploads/{upload_id}', video[half:], {'Upload-Offset': str(half)})
+        body, content_type = multipart({'event_id': random.choice(event_ids), 'year': 2025}, [])
+        return 'POST', f'/api/uploads/{upload_id}/complete', body, {'Content-Type': content_type}
+
+    reads, writes = args.requests, args.upload_requests
+    return [
+        # --- Lectura pública ---
+        ('GET /api/events', reads, {'build': get('/api/events')}),
+        ('GET /api/gallery', reads, {'build': get('/api/gallery')}),
+        ('GET /api/gallery?cursor', reads, {'build': get(f'/api/gallery?cursor={cursor}')}),
+        ('GET /api/gallery?event_id&year', reads, {
+            'build': lambda: ('GET', f'/api/gallery?event_id={random.choice(event_ids)}&year=2024', None, {})
+        }),
+        ('GET /api/sponsors', reads, {'build': get('/api/sponsors')}),
+        ('GET /api/hero-settings', reads, {'build': get('/api/hero-settings')}),
+        ('GET /api/event-info', reads, {'build': get('/api/event-info')}),
+        ('GET /api/stats', reads, {'build': get('/api/stats')}),
+        ('GET /metrics', reads, {'build': get('/metrics')}),
+        ('GET /', reads, {'build': get('/')}),
+        # --- Administración ---
+        ('POST /api/admin/login', reads, {'build': lambda: (
+            'POST', '/api/admin/login', json.dumps({'password': 'bench'}).encode(),
+            {'Content-Type': 'application/json'}
+        )}),
+        ('POST /api/events', writes, {
+            'build': form('POST', '/api/events', lambda: {
+                'title': 'Bench', 'date': '2025-08-10', 'description': 'Evento de benchmark', 'featured': 'false'
+            }, lambda: [('file', 'evento.png', image)]),
+            'after': remember('events', 'event')
+        }),
+        ('PUT /api/events/<id>', writes, {
+            'build': form('PUT', f'/api/events/{event_ids[0]}', lambda: {
+                'title': 'Bench editado', 'featured': 'true'
+            }, lambda: [])
+        }),
+        ('POST /api/gallery', writes, {
+            'build': form('POST', '/api/gallery', lambda: {
+                'event_id': random.choice(event_ids), 'year': 2025
+            }, lambda: [('file', 'foto.png', image)]),
+            'after': remember('gallery', 'item')
+        }),
+        ('POST /api/gallery/bulk', writes, {
+            'build': form('POST', '/api/gallery/bulk', lambda: {
+                'event_id': random.choice(event_ids), 'year': 2025
+            }, lambda: [('files[]', f'foto_{i}.png', image) for i in range(args.bulk_files)])
+        }),
+        ('POST /api/uploads (chunked)', writes, {'build': chunked_upload}),
+        ('POST /api/sponsors', writes, {
+            'build': form('POST', '/api/sponsors', lambda: {'name': 'Bench', 'tier': 'oro'},
+                          lambda: [('file', 'logo.png', image)]),
+            'after': remember('sponsors', 'sponsor')
+        }),
+        ('PUT /api/hero-settings/video', writes, {
+            'build': form('PUT', '/api/hero-settings/video', lambda: {}, lambda: [('file', 'hero.mp4', video)])
+        }),
+        ('PUT /api/hero-settings/event-date', writes, {'build': lambda: (
+            'PUT', '/api/hero-settings/event-date', json.dumps({'eventDate': '2025-08-10T06:00:00'}).encode(),
+            {'Content-Type': 'application/json'}
+        )}),
+        ('DELETE /api/gallery/<id>', writes, {
+            'build': lambda: ('DELETE', f'/api/gallery/{next(gallery_delete_ids)}', None, {})
+        }),
+        ('DELETE /api/sponsors/<id>', writes, {'build': pop_created('sponsors', '/api/sponsors/{}')}),
+        ('DELETE /api/events/<id>', writes, {'build': pop_created('events', '/api/events/{}')}),
+    ]
+
+
+# ==================== INFORME ====================
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)['endpoints']
+    with open(after_path) as f:
+        after = json.load(f)['endpoints']
+    print(f"{'endpoint':40} {'rps':>18} {'p95 ms':>18} {'queries':>14}")
+    for name in after:
+        if name not in before:
+            continue
+        b, a = before[name], after[name]
+        print(f"{name:40} {b['throughput_rps']:>8} -> {a['throughput_rps']:<8} "
+              f"{b['p95_ms']:>8} -> {a['p95_ms']:<8} {b['mean_queries']!s:>5} -> {a['mean_queries']!s:<5}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de la API Flask')
+    parser.add_argument('--events', type=int, default=100)
+    parser.add_argument('--gallery', type=int, default=50000)
+    parser.add_argument('--sponsors', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='peticiones por endpoint de lectura')
+    parser.add_argument('--upload-requests', type=int, default=50, help='peticiones por endpoint de escritura')
+    parser.add_argument('--bulk-files', type=int, default=20)
+    parser.add_argument('--video-kb', type=int, default=512)
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cache-ttl', type=float, default=300, help='0 desactiva la caché de respuestas')
+    parser.add_argument('--database-url', help='por defecto, SQLite temporal')
+    parser.add_argument('--only', help='regex: solo los endpoints que coincidan')
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DESPUES'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='quibd-bench-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        seed_start = time.perf_counter()
+        event_ids = seed(database_url, args.events, args.gallery, args.sponsors)
+        seed_seconds = time.perf_counter() - seed_start
+
+        port = free_port()
+        process, server = start_server(args, workdir, database_url, port)
+        try:
+            results = {}
+            for name, total, scenario in build_scenarios(args, event_ids, port):
+                if args.only and not re.search(args.only, name):
+                    continue
+                results[name] = run_scenario(port, process.pid, scenario, total, args.concurrency)
+                print(f"{name:40} {results[name]['throughput_rps']:>9} rps  "
+                      f"p50 {results[name]['p50_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms  "
+                      f"queries {results[name]['mean_queries']}", flush=True)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        try:
+            revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                      text=True).stdout.strip() or None
+        except OSError:
+            revision = None
+        report = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'revision': revision,
+                'server': server,
+                'database': database_url.split(':', 1)[0],
+                'seed_seconds': round(seed_seconds, 2),
+                'config': {k: v for k, v in vars(args).items() if k not in ('compare', 'database_url')}
+            },
+            'endpoints': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Resultados guardados en {args.output}")
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
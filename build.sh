@@ -19,4 +19,8 @@ else
   npm run build
 fi
 
+# --- Precompresión del frontend (gzip + brotli) para WhiteNoise ---
+echo "Precompressing dist/..."
+python -m whitenoise.compress dist
+
 echo "Build process completed!"
@@ -0,0 +1,13 @@
+import os
+
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# El master importa y crea la app una sola vez y los workers la heredan por fork:
+# arrancan rápido y comparten memoria. create_app() descarta el pool de conexiones
+# heredado en cada hijo, así que ningún socket de base de datos se comparte entre procesos.
+preload_app = True
@@ -243,6 +243,8 @@ function EventsManager() {
 
 function GalleryManager() {
   const [items, setItems] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [events, setEvents] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
   const [files, setFiles] = useState<File[]>([]);
@@ -272,6 +274,7 @@ function GalleryManager() {
       setLoading(true);
       const response = await galleryAPI.getAll();
       setItems(response.items);
+      setNextCursor(response.next_cursor);
     } catch (error) {
       toast.error("Error al cargar galería");
       console.error(error);
@@ -280,6 +283,22 @@ function GalleryManager() {
     }
   };
 
+  // La galería llega paginada: las fotos más antiguas se piden con el cursor de la última página
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await galleryAPI.getAll({ cursor: nextCursor });
+      setItems(prev => [...prev, ...response.items]);
+      setNextCursor(response.next_cursor);
+    } catch (error) {
+      toast.error("Error al cargar galería");
+      console.error(error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const selectedFiles = Array.from(e.target.files || []);
     setFiles(selectedFiles);
@@ -345,7 +364,8 @@ function GalleryManager() {
     try {
       await galleryAPI.delete(itemId);
       toast.success("Elemento eliminado");
-      loadGallery();
+      // Sin recargar: se conservan las páginas ya cargadas
+      setItems(prev => prev.filter(item => item.id !== itemId));
     } catch (error: any) {
       toast.error(error.message || "Error al eliminar elemento");
     }
@@ -483,6 +503,14 @@ function GalleryManager() {
           </Card>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="text-center">
+          <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? "Cargando..." : "Cargar más"}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
@@ -10,19 +10,50 @@ const handleResponse = async (response: Response) => {
   return response.json();
 };
 
+// Las peticiones con archivo pasan por un cupo en el servidor: con 429 se espera lo que indique
+// Retry-After y se reintenta la misma petición (FormData y Blob se pueden reenviar)
+const waitRetryAfter = (response: Response) =>
+  new Promise((resolve) => setTimeout(resolve, (Number(response.headers.get('Retry-After')) || 5) * 1000));
+
+const fetchWithRetry = async (url: string, init: RequestInit, attempts = 3): Promise<Response> => {
+  for (let attempt = 1; ; attempt++) {
+    const response = await fetch(url, init);
+    if (response.status !== 429 || attempt >= attempts) return response;
+    await waitRetryAfter(response);
+  }
+};
+
+const toQueryString = (params: Record<string, string | number | undefined>) =>
+  new URLSearchParams(
+    Object.entries(params)
+      .filter(([, value]) => value !== undefined && value !== '')
+      .map(([key, value]) => [key, String(value)])
+  ).toString();
+
+export interface SearchQuery {
+  limit?: number;
+  offset?: number;
+}
+
 // ==================== EVENTOS ====================
 export const eventsAPI = {
-  getAll: () =>
-    fetch(`${API_BASE_URL}/events`).then(handleResponse),
+  // Con `since` (el `version` de una respuesta anterior) solo llegan los cambios y los ids borrados;
+  // si `reset` es true, `events` es la lista completa y reemplaza a la local
+  getAll: (since?: number) =>
+    fetch(`${API_BASE_URL}/events${since !== undefined ? `?since=${since}` : ''}`).then(handleResponse),
+
+  // Búsqueda por relevancia (título, descripción y categoría); paginar con `next_offset`
+  search: (q: string, params: SearchQuery = {}) =>
+    fetch(`${API_BASE_URL}/events/search?${toQueryString({ q, ...params })}`).then(handleResponse),
 
   create: (formData: FormData) =>
-    fetch(`${API_BASE_URL}/events`, {
+    fetchWithRetry(`${API_BASE_URL}/events`, {
       method: 'POST',
       body: formData, // No lleva headers de Content-Type, el navegador lo pone solo con el boundary
     }).then(handleResponse),
 
   update: (eventId: string, formData: FormData) =>
-    fetch(`${API_BASE_URL}/events/${eventId}`, {
+    fetchWithRetry(`${API_BASE_URL}/events/${eventId}`, {
       method: 'PUT',
       body: formData,
     }).then(handleResponse),
@@ -34,18 +65,38 @@ export const eventsAPI = {
 };
 
 // ==================== GALERÍA ====================
+export interface GalleryQuery {
+  limit?: number;
+  cursor?: string;
+  event_id?: string | number;
+  year?: string | number;
+  type?: string;
+  // Delta: sin paginación; si `reset` es true hay que recargar la galería completa
+  since?: number;
+}
+
 export const galleryAPI = {
-  getAll: () =>
-    fetch(`${API_BASE_URL}/gallery`).then(handleResponse),
+  // Paginado por cursor: usar `next_cursor` de la respuesta para pedir la siguiente página
+  getAll: (params: GalleryQuery = {}) => {
+    const query = toQueryString({ ...params });
+    return fetch(`${API_BASE_URL}/gallery${query ? `?${query}` : ''}`).then(handleResponse);
+  },
+
+  search: (q: string, params: SearchQuery & { event_id?: string | number; year?: string | number } = {}) =>
+    fetch(`${API_BASE_URL}/gallery/search?${toQueryString({ q, ...params })}`).then(handleResponse),
+
+  // URL del ZIP con todos los archivos de un evento y/o año (para un enlace de descarga)
+  exportUrl: (params: { event_id?: string | number; year?: string | number }) =>
+    `${API_BASE_URL}/gallery/export?${toQueryString(params)}`,
 
   create: (formData: FormData) =>
-    fetch(`${API_BASE_URL}/gallery`, {
+    fetchWithRetry(`${API_BASE_URL}/gallery`, {
       method: 'POST',
       body: formData,
     }).then(handleResponse),
 
   createBulk: (formData: FormData) =>
-    fetch(`${API_BASE_URL}/gallery/bulk`, {
+    fetchWithRetry(`${API_BASE_URL}/gallery/bulk`, {
       method: 'POST',
       body: formData,
     }).then(handleResponse),
@@ -58,11 +109,12 @@ export const galleryAPI = {
 
 // ==================== PATROCINADORES (Sponsors) ====================
 export const sponsorsAPI = {
-  getAll: () =>
-    fetch(`${API_BASE_URL}/sponsors`).then(handleResponse),
+  // Igual que eventsAPI.getAll: con `reset` llega la lista completa
+  getAll: (since?: number) =>
+    fetch(`${API_BASE_URL}/sponsors${since !== undefined ? `?since=${since}` : ''}`).then(handleResponse),
 
   create: (formData: FormData) =>
-    fetch(`${API_BASE_URL}/sponsors`, {
+    fetchWithRetry(`${API_BASE_URL}/sponsors`, {
       method: 'POST',
       body: formData,
     }).then(handleResponse),
@@ -75,11 +127,12 @@ export const sponsorsAPI = {
 
 // ==================== CONFIGURACIÓN HERO ====================
 export const heroAPI = {
-  getSettings: () =>
-    fetch(`${API_BASE_URL}/hero-settings`).then(handleResponse),
+  // Con `since`, `settings` es null si no hubo cambios
+  getSettings: (since?: number) =>
+    fetch(`${API_BASE_URL}/hero-settings${since !== undefined ? `?since=${since}` : ''}`).then(handleResponse),
 
   updateVideo: (formData: FormData) =>
-    fetch(`${API_BASE_URL}/hero-settings/video`, {
+    fetchWithRetry(`${API_BASE_URL}/hero-settings/video`, {
       method: 'PUT',
       body: formData,
     }).then(handleResponse),
@@ -92,7 +145,91 @@ export const heroAPI = {
     }).then(handleResponse),
 };
 
+// ==================== CAMBIOS EN VIVO ====================
+export const changesAPI = {
+  // Stream SSE con la última versión; el navegador se reconecta solo. Devuelve la función para cerrarlo
+  subscribe: (onVersion: (version: number) => void) => {
+    let source: EventSource | null = null;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    let delay = 3000;
+    let closed = false;
+    const open = () => {
+      source = new EventSource(`${API_BASE_URL}/changes/stream`);
+      source.addEventListener('version', (event) => {
+        delay = 3000;
+        onVersion(JSON.parse((event as MessageEvent).data).version);
+      });
+      // Tras un error HTTP (500, proxy caído) el navegador no reintenta: se reabre con espera creciente
+      source.onerror = () => {
+        if (closed || source?.readyState !== EventSource.CLOSED) return;
+        timer = setTimeout(open, delay);
+        delay = Math.min(delay * 2, 60000);
+      };
+    };
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      source?.close();
+    };
+  },
+};
+
+// ==================== SUBIDA POR PARTES (videos grandes) ====================
+export type ChunkUploadTarget = 'hero' | 'gallery' | 'sponsor' | 'event';
+
+export const chunkedUploadAPI = {
+  // Sube `file` por partes; si se pasa `uploadId` reanuda desde el último offset confirmado
+  upload: async (
+    file: File,
+    target: ChunkUploadTarget,
+    fields: Record<string, string> = {},
+    uploadId?: string,
+  ) => {
+    let offset = 0;
+    let chunkSize = 1024 * 1024;
+    if (uploadId) {
+      offset = (await fetch(`${API_BASE_URL}/uploads/${uploadId}`).then(handleResponse)).offset;
+    } else {
+      const init = await fetch(`${API_BASE_URL}/uploads`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size, target }),
+      }).then(handleResponse);
+      uploadId = init.upload_id as string;
+      chunkSize = init.chunk_size;
+    }
+
+    while (offset < file.size) {
+      const chunk = file.slice(offset, offset + chunkSize * 4);
+      const response = await fetch(`${API_BASE_URL}/uploads/${uploadId}`, {
+        method: 'PATCH',
+        headers: { 'Upload-Offset': String(offset) },
+        body: chunk,
+      });
+      // Servidor saturado de subidas: esperar lo que indique Retry-After y reintentar la misma parte
+      if (response.status === 429) {
+        await waitRetryAfter(response);
+        continue;
+      }
+      offset = (await handleResponse(response)).offset;
+    }
+
+    const formData = new FormData();
+    Object.entries(fields).forEach(([key, value]) => formData.append(key, value));
+    return fetchWithRetry(`${API_BASE_URL}/uploads/${uploadId}/complete`, {
+      method: 'POST',
+      body: formData,
+    }).then(handleResponse);
+  },
+};
+
 // ==================== OTROS (Admin, Stats, Info) ====================
+// Portada: hero, fecha, eventos destacados/recientes, patrocinadores por nivel y primera página de galería
+export const bootstrapAPI = {
+  get: () => fetch(`${API_BASE_URL}/bootstrap`).then(handleResponse),
+};
+
 export const eventInfoAPI = {
   get: () => fetch(`${API_BASE_URL}/event-info`).then(handleResponse),
 };
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db, init_db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'CHUNK_UPLOAD_FOLDER': str(tmp_path / 'uploads_partial'),
+        'METRICS_DIR': '',
+        'GC_INTERVAL': 0,
+    })
+    with app.app_context():
+        init_db()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def statements(app):
+    # SQL ejecutado por la base de datos durante la prueba
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def add_gallery_items(client, count):
+    client.post('/api/events', data={'title': 'Festival', 'date': '2025-08-10', 'description': 'x'})
+    files = [(io.BytesIO(f'video {i}'.encode()), f'video_{i}.mp4') for i in range(count)]
+    response = client.post('/api/gallery/bulk', data={'files[]': files, 'event_id': '1', 'year': '2025', 'type': 'video'})
+    # La subida masiva responde en streaming con el progreso; se consume para completarla
+    assert response.status_code == 200
+    response.get_data()
+
+
+def gallery_queries(statements):
+    return [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'gallery_items' in s]
+
+
+@pytest.mark.parametrize('count', [1, 25])
+def test_gallery_list_is_one_query(app, statements, count):
+    client = app.test_client()
+    add_gallery_items(client, count)
+    statements.clear()
+
+    response = client.get('/api/gallery?limit=100')
+
+    assert response.status_code == 200
+    items = response.get_json()['items']
+    assert len(items) == count
+    assert all(item['event'] == 'Festival' for item in items)
+    # Una sola consulta con el título del evento unido: ninguna carga perezosa por elemento
+    assert len(gallery_queries(statements)) == 1
+    assert not [s for s in statements if 'FROM events' in s and 'gallery_items' not in s]
+
+
+def test_gallery_list_query_count_does_not_grow(app, statements):
+    client = app.test_client()
+    add_gallery_items(client, 2)
+    statements.clear()
+    client.get('/api/gallery?limit=100')
+    small = len(statements)
+
+    add_gallery_items(client, 30)
+    statements.clear()
+    client.get('/api/gallery?limit=100')
+
+    assert len(statements) == small